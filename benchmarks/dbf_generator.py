@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+
+
+# Generate a deterministic dBase file (and a memo file if there is a M field):
+# python benchmarks/dbf_generator.py path/to/t.dbf [rows] [--encoding cp850]
+#     [--fields code:C:10,name:C:40,quantity:N:10:0,amount:N:15:2,rate:F:12:4,valid:L:1,day:D:8,notes:M:10]
+
+import argparse
+import datetime
+import os
+import random
+import struct
+
+# no memo field: the tables are read by the native DBFReader (see MEMO_FIELDS for dbfread)
+DEFAULT_FIELDS = "code:C:10,name:C:40,quantity:N:10:0,amount:N:15:2,rate:F:12:4,valid:L:1,day:D:8"
+MEMO_FIELDS = DEFAULT_FIELDS + ",notes:M:10"
+
+_WORDS = ["état", "région", "São Paulo", "Müller", "naïve", "tax", "total", "amount", "river", "mountain", "city",
+          "north", "south", "year", "value", "office"]
+_MEMO_BLOCK_SIZE = 512
+# the number of distinct values of each field: the records are drawn from
+# pools to generate millions of rows quickly
+_POOL_SIZE = 1024
+
+
+def parse_fields(spec):
+    """Return a list of (name, type, length, decimal_count) from a spec like
+    name:C:40,amount:N:15:2"""
+    fields = []
+    for field in spec.split(","):
+        name, field_type, length, *decimal_count = field.strip().split(":")
+        fields.append((name, field_type.upper(), int(length), int(decimal_count[0]) if decimal_count else 0))
+    return fields
+
+
+def generate_dbf(path, rows, fields=DEFAULT_FIELDS, encoding="cp850", seed=0):
+    """Write a dBase III table of rows random records to path (and a .dbt memo
+    file if there is a M field). The output only depends on the arguments.
+    Return the total size of the files in bytes"""
+    if isinstance(fields, str):
+        fields = parse_fields(fields)
+    rnd = random.Random(seed)
+    has_memo = any(field_type == "M" for _, field_type, _, _ in fields)
+    memo_path = os.path.splitext(path)[0] + ".dbt"
+    memo_pool = []
+    if has_memo:
+        memo_pool = _write_memo_file(memo_path, rnd, encoding)
+    pools = [_value_pool(rnd, field_type, length, decimal_count, encoding, memo_pool)
+             for _, field_type, length, decimal_count in fields]
+
+    recordlen = 1 + sum(length for _, _, length, _ in fields)
+    headerlen = 32 + 32 * len(fields) + 1
+    today = datetime.date(2018, 1, 1)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<BBBBLHH20x", 0x83 if has_memo else 0x03, today.year - 1900, today.month, today.day, rows,
+                            headerlen, recordlen))
+        for name, field_type, length, decimal_count in fields:
+            f.write(struct.pack("<11scLBB14x", name.encode("ascii"), field_type.encode("ascii"), 0, length, decimal_count))
+        f.write(b"\r")
+        choices = rnd.choices
+        for start in range(0, rows, _POOL_SIZE):
+            count = min(_POOL_SIZE, rows - start)
+            columns = [choices(pool, k=count) for pool in pools]
+            f.write(b"".join(b" " + b"".join(values) for values in zip(*columns)))
+        f.write(b"\x1a")
+    return os.path.getsize(path) + (os.path.getsize(memo_path) if has_memo else 0)
+
+
+def _value_pool(rnd, field_type, length, decimal_count, encoding, memo_pool):
+    pool = []
+    for _ in range(_POOL_SIZE):
+        if field_type == "C":
+            value = _fit(" ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(1, 6))), length, encoding)
+            data = value.encode(encoding).ljust(length)
+        elif field_type in "NF":
+            if rnd.random() < 0.02:
+                data = b" " * length # a NULL
+            else:
+                digits = length - decimal_count - (2 if decimal_count else 1)
+                value = rnd.uniform(-10 ** digits + 1, 10 ** digits - 1)
+                data = "{:{}.{}f}".format(value, length, decimal_count).encode("ascii")
+        elif field_type == "L":
+            data = bytes([rnd.choice(b"TFYN?")])
+        elif field_type == "D":
+            day = datetime.date(1990, 1, 1) + datetime.timedelta(days=rnd.randrange(365 * 30))
+            data = day.strftime("%Y%m%d").encode("ascii")
+        elif field_type == "M":
+            data = str(rnd.choice(memo_pool)).rjust(length).encode("ascii")
+        else:
+            raise ValueError("Unsupported field type: {}".format(field_type))
+        pool.append(data)
+    return pool
+
+
+def _fit(value, length, encoding):
+    # truncate a string to length encoded bytes without breaking a character
+    while len(value.encode(encoding)) > length:
+        value = value[:-1]
+    return value
+
+
+def _write_memo_file(memo_path, rnd, encoding):
+    """Write _POOL_SIZE memos and return their block numbers"""
+    blocks = []
+    block = 1
+    with open(memo_path, "wb") as f:
+        f.write(b"\0" * _MEMO_BLOCK_SIZE) # the next free block is written at the end
+        for _ in range(_POOL_SIZE):
+            text = " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(5, 200)))
+            data = text.encode(encoding) + b"\x1a\x1a"
+            data += b"\0" * (-len(data) % _MEMO_BLOCK_SIZE)
+            f.write(data)
+            blocks.append(block)
+            block += len(data) // _MEMO_BLOCK_SIZE
+        f.seek(0)
+        f.write(struct.pack("<L", block))
+    return blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a deterministic dBase table')
+    parser.add_argument("path", help='the dbf file')
+    parser.add_argument("rows", nargs='?', type=int, default=10 ** 6, help='the number of rows')
+    parser.add_argument("--fields", default=DEFAULT_FIELDS, help='name:type:length[:decimal_count],...')
+    parser.add_argument("--encoding", default="cp850")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    size = generate_dbf(args.path, args.rows, args.fields, args.encoding, args.seed)
+    print("{}: {} rows, {:.1f} MB".format(args.path, args.rows, size / (1 << 20)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+
+# Compare the csv export with the previous row by row export on a generated
+# table: python benchmarks/export_benchmark.py [rows]
+
+import csv
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from sqliteondbf.executor import export, zstandard
+
+
+def generate_connection(rows, seed=0):
+    """Return a connection with a table t of rows rows of text, integer, real
+    and date values"""
+    rnd = random.Random(seed)
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE t (code TEXT, name TEXT, quantity INTEGER, amount REAL, day DATE)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?, ?, ?)",
+                           (("C{:06d}".format(i), "name, {}".format(rnd.randint(0, 1000)), rnd.randint(0, 10 ** 6),
+                             rnd.random() * 10 ** 4, "2018-{:02d}-{:02d}".format(rnd.randint(1, 12), rnd.randint(1, 28)))
+                            for i in range(rows)))
+    return connection
+
+
+def row_by_row_export(cursor, csv_path):
+    """The export before the fetchmany/writerows path"""
+    with open(csv_path, 'w', newline='', encoding='utf-8') as dest:
+        writer = csv.writer(dest)
+        writer.writerow([description[0] for description in cursor.description])
+        for row in cursor:
+            writer.writerow(row)
+
+
+def measure(connection, rows, function, path):
+    cursor = connection.execute("SELECT * FROM t")
+    start = time.perf_counter()
+    function(cursor, path)
+    seconds = time.perf_counter() - start
+    size = os.path.getsize(path)
+    return {"seconds": round(seconds, 3), "mb": round(size / (1 << 20), 2),
+            "rows_per_second": round(rows / seconds), "mb_per_second": round(size / (1 << 20) / seconds, 2)}
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    connection = generate_connection(rows)
+    results = {"benchmark": "export", "rows": rows}
+    with tempfile.TemporaryDirectory() as d:
+        results["row_by_row"] = measure(connection, rows, row_by_row_export, os.path.join(d, "a.csv"))
+        results["csv"] = measure(connection, rows, export, os.path.join(d, "b.csv"))
+        results["csv_gzip"] = measure(connection, rows, export, os.path.join(d, "c.csv.gz"))
+        if zstandard is not None:
+            results["csv_zstd"] = measure(connection, rows, export, os.path.join(d, "d.csv.zst"))
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+
+# Compare the Splitter with the previous character by character splitter on a
+# generated script: python benchmarks/splitter_benchmark.py [size in MB]
+
+import io
+import json
+import random
+import sys
+import time
+
+from sqliteondbf.splitter import Splitter
+
+
+def generate_script(size, seed=0):
+    """Return a script of about size characters: big INSERT ... VALUES blocks,
+    $def bodies, comments and instructions"""
+    rnd = random.Random(seed)
+    chunks = []
+    length = 0
+    while length < size:
+        kind = rnd.random()
+        if kind < 0.6:
+            values = ",\n".join("({}, '{}', \"{}\", {:.2f})".format(i, "it''s;" * rnd.randint(0, 3), "x" * rnd.randint(0, 20),
+                                                                    rnd.random()) for i in range(rnd.randint(10, 500)))
+            chunk = "INSERT INTO t VALUES\n{};\n".format(values)
+        elif kind < 0.75:
+            chunk = "$def f{0}(x):\n    return 'a;b' + str(x) * {0};\n".format(rnd.randint(0, 100))
+        elif kind < 0.85:
+            chunk = "/* a block comment; with a separator */\n-- a line comment; with a separator\n"
+        elif kind < 0.95:
+            chunk = "$connect dbf 'path/to/files' utf-8 --jobs 4 --batch-size 10000;\n"
+        else:
+            chunk = "SELECT a, b FROM t WHERE c = 'x' ORDER BY a;\n$view 10;\n"
+        chunks.append(chunk)
+        length += len(chunk)
+    return "".join(chunks)
+
+
+def measure(splitter, script):
+    start = time.perf_counter()
+    chunks = list(splitter.split(io.StringIO(script)))
+    return time.perf_counter() - start, chunks
+
+
+class CharSplitter():
+    """The splitter before the rewrite: a state machine fed by script.read(1)"""
+    __NONE = 0
+
+    __OPEN_BLOCK_COMMENT_C1 = 10
+    __BLOCK_COMMENT_OPENED = 11
+    __BLOCK_COMMENT_OPENED_CLOSE_BLOCK_COMMENT_C1 = 12
+
+    __OPEN_LINE_COMMENT_C1 = 20
+    __OPEN_LINE_COMMENT_C1 = 21
+    __LINE_COMMENT_OPENED = 22
+
+    __DOUBLE_QUOTED = 30
+    __DOUBLE_QUOTED_ESCAPE = 31
+
+    __SINGLE_QUOTED = 40
+    __SINGLE_QUOTED_ESCAPE = 41
+
+    def __init__(self, block_comment=("/*", "*/"), line_comment="--", splitter=";"):
+        self.__block_comment = block_comment
+        self.__line_comment = line_comment
+        self.__splitter = splitter
+
+    def split(self, script):
+        if type(script) == str:
+            script = io.StringIO(script)
+
+        cur_chunk = []
+        state = CharSplitter.__NONE
+        while True:
+            c = script.read(1)
+            if not c:
+                break
+
+            if state == CharSplitter.__NONE:
+                if c == self.__block_comment[0][0]:
+                    state = CharSplitter.__OPEN_BLOCK_COMMENT_C1
+                elif c == self.__line_comment[0] and not self.__is_instruction(cur_chunk):
+                    state = CharSplitter.__OPEN_LINE_COMMENT_C1
+                elif c == "\"":
+                    state = CharSplitter.__DOUBLE_QUOTED
+                elif c == "'":
+                    state = CharSplitter.__SINGLE_QUOTED
+                elif c == self.__splitter:
+                    chunk = "".join(cur_chunk).strip()
+                    if chunk:
+                        yield chunk
+                    cur_chunk = []
+                    continue
+            elif state == CharSplitter.__OPEN_BLOCK_COMMENT_C1:
+                if c == self.__block_comment[0][1]:
+                    state = CharSplitter.__BLOCK_COMMENT_OPENED
+                else:
+                    state = CharSplitter.__NONE
+            elif state == CharSplitter.__BLOCK_COMMENT_OPENED:
+                if c == self.__block_comment[1][0]:
+                    state = CharSplitter.__BLOCK_COMMENT_OPENED_CLOSE_BLOCK_COMMENT_C1
+            elif state == CharSplitter.__BLOCK_COMMENT_OPENED_CLOSE_BLOCK_COMMENT_C1:
+                if c == self.__block_comment[1][1]:
+                    cur_chunk = []
+                    state = CharSplitter.__NONE
+                    continue
+            elif state == CharSplitter.__OPEN_LINE_COMMENT_C1:
+                if c == self.__line_comment[1]:
+                    state = CharSplitter.__LINE_COMMENT_OPENED
+                else:
+                    state = CharSplitter.__NONE
+            elif state == CharSplitter.__LINE_COMMENT_OPENED:
+                if c == "\n":
+                    cur_chunk = []
+                    state = CharSplitter.__NONE
+                    continue
+            elif state == CharSplitter.__DOUBLE_QUOTED:
+                if c == "\\":
+                    state = CharSplitter.__DOUBLE_QUOTED_ESCAPE
+                if c == "\"":
+                    state = CharSplitter.__NONE
+            elif state == CharSplitter.__DOUBLE_QUOTED_ESCAPE:
+                state = CharSplitter.__DOUBLE_QUOTED;
+            elif state == CharSplitter.__SINGLE_QUOTED:
+                if c == "\\":
+                    state = CharSplitter.__SINGLE_QUOTED_ESCAPE
+                if c == "'":
+                    state = CharSplitter.__NONE
+            elif state == CharSplitter.__SINGLE_QUOTED_ESCAPE:
+                state = CharSplitter.__SINGLE_QUOTED;
+
+            cur_chunk.append(c)
+
+        chunk = "".join(cur_chunk).strip()
+        if chunk:
+            yield chunk
+
+    def __is_instruction(self, cur_chunk):
+        return "".join(cur_chunk).lstrip().startswith("$")
+
+
+def main():
+    size = int(float(sys.argv[1]) * (1 << 20)) if len(sys.argv) > 1 else 4 << 20
+    script = generate_script(size)
+    char_seconds, char_chunks = measure(CharSplitter(), script)
+    seconds, chunks = measure(Splitter(), script)
+    if chunks != char_chunks:
+        raise Exception("the splitters don't yield the same chunks")
+    mb = len(script) / (1 << 20)
+    print(json.dumps({
+        "benchmark": "splitter",
+        "characters": len(script),
+        "chunks": len(chunks),
+        "char_splitter": {"seconds": round(char_seconds, 3), "mb_per_second": round(mb / char_seconds, 2)},
+        "splitter": {"seconds": round(seconds, 3), "mb_per_second": round(mb / seconds, 2)},
+        "speedup": round(char_seconds / seconds, 1),
+    }, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+
+
+# Run the timed scenarios on a generated dBase table and print the results as
+# JSON, to compare the commits:
+# python benchmarks/suite.py [--rows 1000000]
+#     [--scenarios convert,convert_memo,connect,split,export,view,dump] [--jobs 4] [--fast-load]
+#     [--pragma journal_mode=WAL ...] [--output results.json]
+# Every scenario runs in a fresh process: peak_rss_mb is the peak resident
+# memory of this process, the preparation included. The convert_memo scenario
+# converts a table with a memo field (--memo-fields): it is read by dbfread
+# instead of the native reader. A --pragma overrides a pragma of the bulk load
+# profile (and implies --fast-load): compare the runs to pick the pragmas.
+
+import argparse
+import collections
+import concurrent.futures
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from dbf_generator import DEFAULT_FIELDS, MEMO_FIELDS, generate_dbf
+from splitter_benchmark import generate_script
+from sqliteondbf.converter import FAST_LOAD_PRAGMAS
+from sqliteondbf.executor import connect, convert, export, view, dump
+from sqliteondbf.splitter import Splitter
+
+
+def convert_scenario(context):
+    sqlite_path = os.path.join(context["dir"], "convert.db")
+    return lambda: convert(context["dbf_dir"], sqlite_path, encoding=context["encoding"], workers=context["jobs"],
+                           fast_load=context["fast_load"]).close(), context["rows"], context["dbf_size"]
+
+
+def convert_memo_scenario(context):
+    sqlite_path = os.path.join(context["dir"], "convert_memo.db")
+    return lambda: convert(context["memo_dbf_dir"], sqlite_path, encoding=context["encoding"], workers=context["jobs"],
+                           fast_load=context["fast_load"]).close(), context["rows"], context["memo_dbf_size"]
+
+
+def connect_scenario(context):
+    return lambda: connect(context["dbf_dir"], encoding=context["encoding"], workers=context["jobs"],
+                           fast_load=context["fast_load"]), context["rows"], context["dbf_size"]
+
+
+def split_scenario(context):
+    script = generate_script(context["script_size"])
+    return lambda: sum(1 for _ in Splitter().split(io.StringIO(script))), None, len(script)
+
+
+def export_scenario(context):
+    cursor = sqlite3.connect(context["sqlite_path"]).execute("SELECT * FROM t")
+    csv_path = os.path.join(context["dir"], "export.csv")
+    return lambda: export(cursor, csv_path), context["rows"], lambda: os.path.getsize(csv_path)
+
+
+def view_scenario(context):
+    limit = min(context["rows"], context["view_limit"])
+    cursor = sqlite3.connect(context["sqlite_path"]).execute("SELECT * FROM t")
+    output = io.StringIO()
+    return lambda: view(cursor, limit, file=output), limit, lambda: len(output.getvalue())
+
+
+def dump_scenario(context):
+    connection = sqlite3.connect(context["sqlite_path"])
+    sql_path = os.path.join(context["dir"], "dump.sql")
+    return lambda: dump(sql_path, connection), context["rows"], lambda: os.path.getsize(sql_path)
+
+
+SCENARIO_BY_NAME = {
+    "convert": convert_scenario,
+    "convert_memo": convert_memo_scenario,
+    "connect": connect_scenario,
+    "split": split_scenario,
+    "export": export_scenario,
+    "view": view_scenario,
+    "dump": dump_scenario,
+}
+
+
+def run_scenario(name, context):
+    """Prepare and time a scenario (in a child process). A scenario returns
+    a function, the number of rows (None: the result of the function) and the
+    number of bytes processed (a callable: evaluated after the run)"""
+    function, rows, size = SCENARIO_BY_NAME[name](context)
+    start = time.perf_counter()
+    ret = function()
+    seconds = time.perf_counter() - start
+    if rows is None:
+        rows = ret
+    if callable(size):
+        size = size()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "seconds": round(seconds, 3),
+        "rows": rows,
+        "mb": round(size / (1 << 20), 2),
+        "rows_per_second": round(rows / seconds),
+        "mb_per_second": round(size / (1 << 20) / seconds, 2),
+        "peak_rss_mb": round(max(usage.ru_maxrss, children.ru_maxrss) / 1024, 1), # KB on Linux
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the sqliteondbf benchmarks')
+    parser.add_argument("--rows", type=int, default=10 ** 6, help='the number of rows of the generated table')
+    parser.add_argument("--fields", default=DEFAULT_FIELDS, help='name:type:length[:decimal_count],...')
+    parser.add_argument("--memo-fields", default=MEMO_FIELDS, help='the fields of the convert_memo table')
+    parser.add_argument("--encoding", default="cp850")
+    parser.add_argument("--scenarios", default=",".join(SCENARIO_BY_NAME), help='a comma separated list of scenarios')
+    parser.add_argument("--jobs", type=int, default=1, help='the number of workers of convert and connect')
+    parser.add_argument("--fast-load", action="store_true", help='convert and connect with the bulk load profile')
+    parser.add_argument("--pragma", action="append", default=[],
+                        help='name=value: override a pragma of the bulk load profile (repeatable, implies --fast-load)')
+    parser.add_argument("--script-size", type=int, default=50 * (1 << 20), help='the size of the split script')
+    parser.add_argument("--view-limit", type=int, default=10 ** 5, help='the number of rows of the view')
+    parser.add_argument("--output", help='write the results to this file')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",")]
+    for name in names:
+        if name not in SCENARIO_BY_NAME:
+            parser.error("unknown scenario: {}".format(name))
+    pragmas = collections.OrderedDict()
+    for pragma in args.pragma:
+        name, sep, value = pragma.partition("=")
+        if not sep or not name.strip() or not value.strip():
+            parser.error("bad pragma: {}, expected name=value".format(pragma))
+        pragmas[name.strip()] = value.strip()
+    fast_load = pragmas or args.fast_load
+    # the pragmas actually set by convert and connect
+    profile = collections.OrderedDict(FAST_LOAD_PRAGMAS) if fast_load else collections.OrderedDict()
+    profile.update(pragmas)
+
+    results = {
+        "benchmark": "suite",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "rows": args.rows,
+        "fields": args.fields,
+        "memo_fields": args.memo_fields,
+        "encoding": args.encoding,
+        "jobs": args.jobs,
+        "fast_load": bool(fast_load),
+        "pragmas": profile,
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as d:
+        dbf_dir = os.path.join(d, "dbf")
+        os.mkdir(dbf_dir)
+        context = {
+            "dir": d,
+            "dbf_dir": dbf_dir,
+            "rows": args.rows,
+            "dbf_size": generate_dbf(os.path.join(dbf_dir, "t.dbf"), args.rows, args.fields, args.encoding),
+            "encoding": args.encoding,
+            "jobs": args.jobs,
+            "fast_load": fast_load,
+            "script_size": args.script_size,
+            "view_limit": args.view_limit,
+            "sqlite_path": os.path.join(d, "base.db"),
+        }
+        if "convert_memo" in names:
+            context["memo_dbf_dir"] = os.path.join(d, "memo_dbf")
+            os.mkdir(context["memo_dbf_dir"])
+            context["memo_dbf_size"] = generate_dbf(os.path.join(context["memo_dbf_dir"], "t.dbf"), args.rows,
+                                                    args.memo_fields, args.encoding)
+        if set(names) & {"export", "view", "dump"}:
+            convert(dbf_dir, context["sqlite_path"], encoding=args.encoding).close()
+
+        spawn = multiprocessing.get_context("spawn")
+        for name in names:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                results["scenarios"][name] = executor.submit(run_scenario, name, context).result()
+            print("{}: {}".format(name, results["scenarios"][name]), file=sys.stderr)
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -42,10 +42,18 @@ setup(
         'Topic :: Database :: Front-Ends',
         'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.8',
     ],
 
     keywords='sqlite dbf converter sql script dbase dbf',
     install_requires=['dbfread>=2.0.7'],
+    extras_require={
+        'vtable': ['apsw'],
+        'columnar': ['pyarrow'],
+        'zstd': ['zstandard'],
+        'numpy': ['numpy'],
+    },
     tests_require=[
         'pytest',
         'codecov',
@@ -56,5 +64,6 @@ setup(
             'sqliteondbf=sqliteondbf.__main__:main',
         ],
     },
-    python_requires='>=3',
+    # sqlite3 backup (3.7) and create_function(deterministic=) (3.8)
+    python_requires='>=3.8',
 )
@@ -20,12 +20,16 @@
 
 import logging
 import argparse
+import signal
+import sys
 
 from sqliteondbf.executor import SQLiteExecutor as _SQLiteExecutor, connect, convert, export, view, dump
+from sqliteondbf.profiler import ScriptProfiler as _ScriptProfiler
+from sqliteondbf.server import QueryServer as _QueryServer
 
-def execute(script, logger=logging.getLogger("sqliteondbf")):
+def execute(script, logger=logging.getLogger("sqliteondbf"), code_cache_dir=None):
     """execute a sqlite3 script on a DBF base"""
-    _SQLiteExecutor(script, logger).execute()
+    _SQLiteExecutor(script, logger, code_cache_dir=code_cache_dir).execute()
 
 def _get_args():
     parser = argparse.ArgumentParser(
@@ -35,12 +39,34 @@ def _get_args():
     parser.add_argument("-v", "--verbose", action="store_true", help='enable verbose mode')
     parser.add_argument("-q", "--quiet", action="store_true", help='enable quiet mode')
     parser.add_argument("-e", action="store", metavar='program', help='execute program')
+    parser.add_argument("--profile", action="store_true", help='print the time of every instruction at the end')
+    parser.add_argument("--profile-udfs", action="store_true", help='profile the def and aggregate functions with cProfile')
+    parser.add_argument("--profile-output", action="store", metavar='file', help='write the profile to a JSON file')
+    parser.add_argument("--cache-results", action="store_true",
+                        help='capture the result of a query to replay it in the next view or export instead of running it again')
+    parser.add_argument("--code-cache", action="store", metavar='dir', help='cache the compiled def and aggregate functions in dir')
 
     return parser.parse_args()
 
-def main():
-    """sqliteondbf main function"""
-    args = _get_args()
+def _get_serve_args(argv):
+    parser = argparse.ArgumentParser(prog="sqliteondbf serve",
+        description='Serve read-only SQL queries on a DBF base over HTTP')
+
+    parser.add_argument("dbf_path", help='the directory of the dbf files')
+    parser.add_argument("-v", "--verbose", action="store_true", help='enable verbose mode')
+    parser.add_argument("-q", "--quiet", action="store_true", help='enable quiet mode')
+    parser.add_argument("--database", metavar='file', help='the converted database (default: a temporary file)')
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", metavar='path', help='listen on a unix socket instead of host:port')
+    parser.add_argument("--pool-size", type=int, default=4, help='the number of read-only connections')
+    parser.add_argument("--refresh", type=float, metavar='seconds', help='import the changed dbf files every seconds')
+    parser.add_argument("--encoding", default="cp850")
+    parser.add_argument("--jobs", type=int, default=1, help='the number of processes of the conversion')
+
+    return parser.parse_args(argv)
+
+def _set_logging(args):
     if args.quiet:
         logging.basicConfig(level=logging.ERROR)
     elif args.verbose:
@@ -48,16 +74,52 @@ def main():
     else:
         logging.basicConfig(level=logging.INFO)
 
+def serve(argv):
+    """sqliteondbf serve function"""
+    args = _get_serve_args(argv)
+    _set_logging(args)
+    server = _QueryServer(args.dbf_path, args.database, (args.host, args.port), args.unix_socket, args.pool_size,
+                          args.refresh, logging.getLogger("sqliteondbf"), encoding=args.encoding, workers=args.jobs)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0)) # shutdown and remove the temporary database
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+def main():
+    """sqliteondbf main function"""
+    if sys.argv[1:2] == ["serve"]:
+        serve(sys.argv[2:])
+        return
+
+    args = _get_args()
+    _set_logging(args)
     logger = logging.getLogger("sqliteondbf")
 
     if args.e and args.script:
         print ("Choose between -e and script")
 
-    if args.e:
-        _SQLiteExecutor(args.e, logger).execute()
+    if args.profile or args.profile_udfs or args.profile_output:
+        profiler = _ScriptProfiler(profile_udfs=args.profile_udfs)
     else:
-        with open(args.script, 'r', encoding='utf-8') as source:
-            _SQLiteExecutor(source, logger).execute()
+        profiler = None
+
+    try:
+        if args.e:
+            _SQLiteExecutor(args.e, logger, code_cache_dir=args.code_cache, profiler=profiler,
+                            cache_results=args.cache_results).execute()
+        else:
+            with open(args.script, 'r', encoding='utf-8') as source:
+                _SQLiteExecutor(source, logger, code_cache_dir=args.code_cache, profiler=profiler,
+                                cache_results=args.cache_results).execute()
+    finally:
+        if profiler is not None:
+            if args.profile_output:
+                profiler.write_json(args.profile_output)
+            if args.profile or args.profile_udfs:
+                print(profiler.format_summary(), file=sys.stderr)
 
 if __name__ == '__main__':
     main()
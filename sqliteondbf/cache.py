@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+
+from sqliteondbf.converter import SQLiteConverter as _SQLiteConverter, source_fingerprint as _source_fingerprint
+from sqliteondbf.index import companion_index_files as _companion_index_files
+
+# change the version if the converted databases change
+_CACHE_VERSION = 1
+_SUFFIX = ".sqlite"
+_RESULT_TABLE = "_sqliteondbf_result"
+_ITER_BATCH_SIZE = 256
+_SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMGT]?)B?$", re.IGNORECASE)
+
+
+def parse_size(size):
+    """Return the number of bytes of a size like 500M or 2G"""
+    if size is None or isinstance(size, int):
+        return size
+    m = _SIZE_RE.match(size.strip())
+    if not m:
+        raise ValueError("Bad size: {}".format(size))
+    return int(float(m.group(1)) * 1024 ** " KMGT".index(m.group(2).upper() or " "))
+
+
+class ConversionCache():
+    """A directory of converted dBases. A converted database is stored in a
+    file named after a fingerprint of the dbf files (paths, sizes, mtimes,
+    header fields, companion index files) and of the conversion options: if a
+    file changes, the fingerprint changes and the cached database is not used
+    anymore.
+
+    If max_size is not None, the least recently used databases are removed
+    when the size of the directory exceeds max_size bytes"""
+
+    def __init__(self, cache_dir, max_size=None, logger=logging.getLogger("sqliteondbf")):
+        self.__cache_dir = cache_dir
+        self.__max_size = parse_size(max_size)
+        self.__logger = logger
+
+    def key(self, dbf_path, **options):
+        """Return the fingerprint of a dBase directory and of the conversion
+        options, or None if the options can't be hashed (e.g. a python
+        function)"""
+        sources = []
+        for fpath in sorted(_SQLiteConverter(None, self.__logger).dbf_files(dbf_path)):
+            sources.append([os.path.relpath(fpath, dbf_path)] + list(_source_fingerprint(fpath)))
+            if options.get("companion_indexes", True):
+                for index_path in _companion_index_files(fpath):
+                    stat = os.stat(index_path)
+                    sources.append([os.path.relpath(index_path, dbf_path), stat.st_size, stat.st_mtime])
+        try:
+            data = json.dumps([_CACHE_VERSION, os.path.abspath(dbf_path), sources, options], sort_keys=True)
+        except TypeError:
+            return None
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def load(self, key, connection):
+        """Copy the cached database to the connection and return True, or
+        return False if there is no database for this key"""
+        path = self.__path(key)
+        if not os.path.isfile(path):
+            return False
+        self.__logger.info("load the converted database from the cache: {}".format(path))
+        source = sqlite3.connect(path)
+        try:
+            source.backup(connection)
+        finally:
+            source.close()
+        os.utime(path) # the mtime is the last use
+        return True
+
+    def store(self, key, connection):
+        """Copy the database of the connection to the cache, then remove the
+        least recently used databases if the cache is too large"""
+        os.makedirs(self.__cache_dir, exist_ok=True)
+        path = self.__path(key)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        self.__logger.info("store the converted database in the cache: {}".format(path))
+        target = sqlite3.connect(tmp_path)
+        try:
+            connection.backup(target)
+        finally:
+            target.close()
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Remove the least recently used databases until the size of the cache
+        is below max_size"""
+        if self.__max_size is None:
+            return
+        entries = []
+        for name in os.listdir(self.__cache_dir):
+            if name.endswith(_SUFFIX):
+                stat = os.stat(os.path.join(self.__cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.__cache_dir, name)))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.__max_size:
+                break
+            if path != keep:
+                self.__logger.info("remove the converted database from the cache: {}".format(path))
+                os.remove(path)
+                total -= size
+
+    def __path(self, key):
+        return os.path.join(self.__cache_dir, key + _SUFFIX)
+
+
+class ResultCache():
+    """The result of the last query of a script. The rows are captured in a
+    temporary table while they are fetched the first time, and the next reads
+    replay this table instead of running the query again. SQLite keeps the
+    temporary table in its page cache and spills it to a temporary file if it
+    is larger (see PRAGMA temp_store and cache_size)"""
+
+    def __init__(self, connection, logger=logging.getLogger("sqliteondbf"), batch_size=1 << 14):
+        self.__connection = connection
+        self.__logger = logger
+        self.__batch_size = batch_size
+        self.__count = 0
+        self.__tables = [] # the tables to drop
+        self.__live = None # the cursor of the query, while the rows are captured
+        self.__replay = None
+        self.__insert = None
+        self.__select = None
+        self.__fetched = False
+
+    def start(self, cursor):
+        """Capture the result of a query: cursor has just executed the query"""
+        self.clear()
+        self.__count += 1
+        table_name = "{}_{}".format(_RESULT_TABLE, self.__count)
+        names = [description[0] for description in cursor.description]
+        # columns without type: the values are stored as they are
+        self.__execute('CREATE TEMP TABLE "{}" ({})'.format(table_name, ", ".join("c{}".format(i) for i in range(len(names)))))
+        self.__tables.append(table_name)
+        self.__insert = 'INSERT INTO temp."{}" VALUES ({})'.format(table_name, ", ".join("?" * len(names)))
+        self.__select = 'SELECT {} FROM temp."{}"'.format(
+            ", ".join('c{} AS "{}"'.format(i, name.replace('"', '""')) for i, name in enumerate(names)), table_name)
+        self.__live = cursor
+        self.__fetched = False
+
+    def cursor(self):
+        """Return a cursor on the result of the last query, or None if there is
+        no result (e.g. the last statement was an INSERT). The first time, the
+        rows are captured while they are fetched from the cursor of the query"""
+        if self.__select is None:
+            return None
+        if not self.__fetched and self.__live is not None:
+            self.__fetched = True
+            return _CapturingCursor(self.__live, self.__capture)
+        self.complete()
+        self.__logger.debug("replay the result of the last query")
+        self.__replay = self.__connection.cursor()
+        return self.__replay.execute(self.__select)
+
+    def complete(self):
+        """Capture the rows that were not fetched and close the cursors: no
+        statement of the cache is pending after this call"""
+        if self.__live is not None:
+            rows = self.__live.fetchmany(self.__batch_size)
+            while rows:
+                self.__capture(rows)
+                rows = self.__live.fetchmany(self.__batch_size)
+            self.__live = None
+            self.__fetched = True
+        if self.__replay is not None:
+            self.__replay.close()
+            self.__replay = None
+
+    def clear(self):
+        """Forget the last result. A temporary table can't be dropped while a
+        statement is pending: it will be dropped later"""
+        if self.__replay is not None:
+            self.__replay.close()
+            self.__replay = None
+        self.__live = self.__insert = self.__select = None
+        for table_name in list(self.__tables):
+            try:
+                self.__execute('DROP TABLE temp."{}"'.format(table_name))
+            except sqlite3.OperationalError:
+                continue
+            self.__tables.remove(table_name)
+
+    def __capture(self, rows):
+        if rows:
+            self.__execute(self.__insert, rows)
+
+    def __execute(self, sql, rows=None):
+        # don't leave a transaction open
+        in_transaction = self.__connection.in_transaction
+        if rows is None:
+            self.__connection.execute(sql)
+        else:
+            self.__connection.executemany(sql, rows)
+        if not in_transaction and self.__connection.in_transaction:
+            self.__connection.commit()
+
+
+class _CapturingCursor():
+    """A cursor that passes the fetched rows to a capture function"""
+
+    def __init__(self, cursor, capture):
+        self.__cursor = cursor
+        self.__capture = capture
+
+    @property
+    def description(self):
+        return self.__cursor.description
+
+    @property
+    def arraysize(self):
+        return self.__cursor.arraysize
+
+    def fetchone(self):
+        row = self.__cursor.fetchone()
+        if row is not None:
+            self.__capture([row])
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self.__cursor.fetchmany(self.__cursor.arraysize if size is None else size)
+        self.__capture(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.__cursor.fetchall()
+        self.__capture(rows)
+        return rows
+
+    def __iter__(self):
+        rows = self.fetchmany(_ITER_BATCH_SIZE)
+        while rows:
+            yield from rows
+            rows = self.fetchmany(_ITER_BATCH_SIZE)
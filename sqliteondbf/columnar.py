@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import datetime
+import logging
+import sqlite3
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMAT_BY_EXTENSION = {
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+}
+
+_VIEW_NAME = "_sqliteondbf_export"
+
+
+def declared_types(connection, query):
+    """Return the declared types of the columns of a SELECT query (the types of
+    the converted tables, e.g. REAL or DATE), or None if the query is not a
+    SELECT. A column that is not a column of a table has an empty type"""
+    try:
+        connection.execute('CREATE TEMP VIEW "{}" AS {}'.format(_VIEW_NAME, query))
+    except sqlite3.Error:
+        return None
+    try:
+        return [row[2].upper() for row in connection.execute('PRAGMA temp.table_info("{}")'.format(_VIEW_NAME))]
+    finally:
+        connection.execute('DROP VIEW temp."{}"'.format(_VIEW_NAME))
+
+
+def write_columnar(cursor, path, file_format, types=None, batch_size=1 << 16, logger=logging.getLogger("sqliteondbf")):
+    """Write the result of the last query to a parquet or arrow (IPC file)
+    file, or as an arrow_stream (IPC stream: path may be a file object). The
+    rows are fetched by batches of batch_size rows, and every batch is written
+    as a record batch. types is the list of the declared SQLite types of the
+    columns (see declared_types): the type of a column is DATE, DATETIME or
+    BOOLEAN (the types of the converter) or the affinity of the declared type.
+    A column without affinity gets the type of its values in the first batch.
+
+    SQLite doesn't check the types: if a value of the first batch doesn't fit
+    the type of its column (e.g. 5.5 in an INTEGER column), the column is
+    widened to REAL or TEXT. A value that doesn't fit in a next batch raises
+    an exception (the schema of the file is already written): CAST the column
+    in the query. The values are never truncated. Needs pyarrow"""
+    if pyarrow is None:
+        raise Exception("the {} export needs pyarrow".format(file_format))
+
+    names = [description[0] for description in cursor.description]
+    rows = cursor.fetchmany(batch_size)
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    sqlite_types = [_column_type(t, column) for t, column in zip(types or [""] * len(names), columns)]
+    arrays = []
+    for i, (name, column) in enumerate(zip(names, columns)):
+        try:
+            arrays.append(_to_array(column, sqlite_types[i]))
+        except _Mismatch:
+            widened = _widened_type(column)
+            logger.info("the values of {} don't fit the type {}: widen to {}".format(name, sqlite_types[i], widened))
+            sqlite_types[i] = widened
+            arrays.append(_to_array(column, widened))
+    schema = pyarrow.schema([(name, _ARROW_TYPE_BY_SQLITE_TYPE[t]()) for name, t in zip(names, sqlite_types)])
+    logger.debug("{} export schema:\n{}".format(file_format, schema))
+
+    if file_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+    elif file_format == "arrow":
+        writer = pyarrow.ipc.new_file(path, schema)
+    elif file_format == "arrow_stream":
+        writer = pyarrow.ipc.new_stream(path, schema)
+    else:
+        raise ValueError("Unknown columnar format: {}".format(file_format))
+
+    try:
+        while rows:
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            rows = cursor.fetchmany(batch_size)
+            arrays = []
+            for name, t, column in zip(names, sqlite_types, zip(*rows)):
+                try:
+                    arrays.append(_to_array(column, t))
+                except _Mismatch as e:
+                    raise Exception("a value of {} doesn't fit the type {} of the first rows: {}. "
+                                    "CAST the column in the query".format(name, t, e))
+    finally:
+        writer.close()
+
+
+class _Mismatch(ValueError):
+    """A value doesn't fit the type of its column"""
+
+
+def _affinity(declared_type):
+    """The affinity of a declared type (see https://www.sqlite.org/datatype3.html)"""
+    if "INT" in declared_type:
+        return "INTEGER"
+    if any(s in declared_type for s in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if "BLOB" in declared_type or not declared_type:
+        return "BLOB"
+    if any(s in declared_type for s in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+
+def _column_type(declared_type, column):
+    declared_type = declared_type.upper()
+    if declared_type in _CONVERTER_TYPES:
+        return declared_type
+    affinity = _affinity(declared_type)
+    if affinity in ("INTEGER", "REAL", "TEXT"):
+        return affinity
+    # NUMERIC or no affinity: the values decide
+    return _value_type(column)
+
+
+def _value_type(column):
+    # the SQLite storage class of the values; integers and floats are REAL
+    value_types = set(_SQLITE_TYPE_BY_PYTHON_TYPE.get(type(v), "TEXT") for v in column if v is not None)
+    if value_types == {"INTEGER", "REAL"}:
+        return "REAL"
+    if len(value_types) == 1:
+        return value_types.pop()
+    return "TEXT"
+
+
+def _widened_type(column):
+    if all(v is None or type(v) in (int, float) for v in column):
+        return "REAL"
+    return "TEXT"
+
+
+def _to_array(column, sqlite_type):
+    """Return the arrow array of the values, or raise _Mismatch if a value
+    doesn't fit the type"""
+    fit = _FIT_BY_SQLITE_TYPE[sqlite_type]
+    values = [None if v is None else fit(v) for v in column]
+    return pyarrow.array(values, type=_ARROW_TYPE_BY_SQLITE_TYPE[sqlite_type]())
+
+
+def _fit_integer(value):
+    if type(value) is not int or not -(1 << 63) <= value < (1 << 63):
+        raise _Mismatch(repr(value))
+    return value
+
+
+def _fit_real(value):
+    if type(value) not in (int, float):
+        raise _Mismatch(repr(value))
+    return float(value)
+
+
+def _fit_text(value):
+    if type(value) is bytes:
+        raise _Mismatch(repr(value))
+    return str(value)
+
+
+def _fit_blob(value):
+    if type(value) is not bytes:
+        raise _Mismatch(repr(value))
+    return value
+
+
+def _fit_boolean(value):
+    if type(value) is not int:
+        raise _Mismatch(repr(value))
+    return bool(value)
+
+
+def _fit_date(value):
+    if isinstance(value, str):
+        try:
+            return datetime.date.fromisoformat(value[:10])
+        except ValueError:
+            raise _Mismatch(repr(value))
+    if isinstance(value, datetime.date):
+        return value
+    raise _Mismatch(repr(value))
+
+
+def _fit_datetime(value):
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise _Mismatch(repr(value))
+    if isinstance(value, datetime.datetime):
+        return value
+    raise _Mismatch(repr(value))
+
+
+_SQLITE_TYPE_BY_PYTHON_TYPE = {
+    int: "INTEGER",
+    float: "REAL",
+    str: "TEXT",
+    bytes: "BLOB",
+}
+
+# the types of the SQLiteConverterWorker, and the storage classes
+if pyarrow is not None:
+    _ARROW_TYPE_BY_SQLITE_TYPE = {
+        "INTEGER": pyarrow.int64,
+        "REAL": pyarrow.float64,
+        "FLOAT": pyarrow.float64,
+        "BOOLEAN": pyarrow.bool_,
+        "TEXT": pyarrow.string,
+        "DATE": pyarrow.date32,
+        "DATETIME": lambda: pyarrow.timestamp("us"),
+        "BLOB": pyarrow.binary,
+    }
+else:
+    _ARROW_TYPE_BY_SQLITE_TYPE = {}
+
+# the dates are stored as ISO strings by sqlite3
+_FIT_BY_SQLITE_TYPE = {
+    "INTEGER": _fit_integer,
+    "REAL": _fit_real,
+    "FLOAT": _fit_real,
+    "TEXT": _fit_text,
+    "BLOB": _fit_blob,
+    "BOOLEAN": _fit_boolean,
+    "DATE": _fit_date,
+    "DATETIME": _fit_datetime,
+}
+
+# the declared types that are not affinities
+_CONVERTER_TYPES = ("BOOLEAN", "DATE", "DATETIME")
@@ -18,10 +18,23 @@
 # * A part of this tool was inspired by https://github.com/olemb/dbfread/blob/master/examples/dbf2sqlite by Ole Martin Bjørndalen / UiT The Arctic University of Norway (under MIT licence)
 # * The example files are adapted from https://www.census.gov/data/tables/2016/econ/stc/2016-annual.html (I didn't find a copyright, but this is fair use I believe)
 
+import collections
+import concurrent.futures
+import contextlib
 import dbfread
+import hashlib
+import itertools
+import json
 import logging
 import os
 import sqlite3
+import struct
+import sys
+import time
+
+from sqliteondbf.index import companion_index_files as _companion_index_files, \
+    read_key_expressions as _read_key_expressions, expression_columns as _expression_columns
+from sqliteondbf.reader import DBFReader as _DBFReader
 
 
 class SQLiteConverter():
@@ -32,32 +45,211 @@ class SQLiteConverter():
         self.__connection = connection
         self.__logger = logger
 
-    def import_dbf(self, dbf_path, lowernames=True, encoding="cp850", char_decode_errors="strict"):
-        """Import a dbf database to the current sqlite connection"""
+    def import_dbf(self, dbf_path, **kwargs):
+        """Import a dbf database (the dbf files of a directory and its
+        subdirectories) to the current sqlite connection. See import_dbf_files
+        for the options"""
         self.__check_path(dbf_path)
         cursor = self.__connection.cursor()
 
+        fpaths = list(self.dbf_files(dbf_path))
+        if fpaths:
+            self.__import_files(cursor, fpaths, **kwargs)
+        else:
+            message = "no dbf file in {}".format(dbf_path)
+            self.__logger.warning(message)
+
+    def import_dbf_files(self, fpaths, **kwargs):
+        """Import some dbf files to the current sqlite connection.
+
+        If workers > 1, the dbf files are decoded by a pool of processes and
+        written by the current thread. If use_mmap is True, the files read
+        natively are memory-mapped. If incremental is True, the files that did
+        not change since the last import with the same options are skipped. If delta is True (implies
+        incremental), the tables have a _recno column: only the records
+        appended or recalled since the last import are imported, and the records
+        flagged as deleted are deleted. If the options of a table changed (or
+        can't be hashed), the whole file is imported.
+
+        indexes is a mapping table name -> list of columns (or of lists of
+        columns). If companion_indexes is True, the key expressions of the
+        .ndx/.mdx/.cdx files of the tables are indexed too. All the indexes are
+        created after the import of all the tables.
+
+        columns is a mapping table name -> list of the columns to import (in the
+        dbf order), where is a mapping table name -> row predicate: a SQL
+        expression on the columns, or a function that takes a dict of the values
+        and returns a boolean. The other fields are not decoded if possible.
+
+        If batch_size is not None, the rows are inserted by batches of
+        batch_size rows and an ImportProgress is reported after every batch:
+        progress is a function that takes the ImportProgress (default: log the
+        progress). If batch_commit is True, the transaction is committed after
+        every batch.
+
+        If narrow_types is True, the numeric fields without decimals are
+        INTEGER columns, and the character values are trimmed and interned. If
+        sample_size > 0 (and strict is False), the numeric fields with decimals
+        whose sample_size first values are integers are INTEGER columns too.
+        If strict is True, the tables are STRICT tables (SQLite >= 3.37): the
+        dates are TEXT and the booleans INTEGER"""
+        self.__import_files(self.__connection.cursor(), fpaths, **kwargs)
+
+    def __import_files(self, cursor, fpaths, lowernames=True, encoding="cp850", char_decode_errors="strict", workers=1,
+                       use_mmap=False, incremental=False, delta=False, indexes=None, companion_indexes=True, columns=None,
+                       where=None, batch_size=None, batch_commit=False, progress=None, narrow_types=False, sample_size=0,
+                       strict=False):
+        if strict and sqlite3.sqlite_version_info < STRICT_VERSION:
+            self.__logger.warning("SQLite {} does not support STRICT tables".format(sqlite3.sqlite_version))
+            strict = False
+        options = _ImportOptions(lowernames, encoding, char_decode_errors, use_mmap, columns or {}, where or {},
+                                 batch_size, batch_commit, progress, narrow_types, sample_size, strict)
+        if incremental or delta:
+            sources = _SourceRegistry(self.__logger, cursor)
+            # a file imported with other options (e.g. columns, encoding) is imported again
+            unchanged = [fpath for fpath in fpaths
+                         if sources.is_unchanged(fpath, _table_options_key(options, _table_name(fpath), delta))]
+            fpaths = [fpath for fpath in fpaths if fpath not in unchanged]
+        else:
+            sources, unchanged = None, []
+
+        imported_tables = []
+        if workers > 1 and not delta:
+            file_count = self.__import_parallel(cursor, fpaths, options, workers, sources, imported_tables)
+        else:
+            file_count = self.__import_sequential(cursor, fpaths, options, sources, imported_tables, delta)
+
+        index_specs = list(self.__explicit_index_specs(indexes))
+        if companion_indexes:
+            index_specs += self.__companion_index_specs(imported_tables, options)
+        for table_name, index_columns in index_specs:
+            create_index(cursor, table_name, index_columns, self.__logger)
+
+        if unchanged:
+            self.__logger.info("{} unchanged file(s) skipped".format(len(unchanged)))
+        self.__logger.info("{} file(s) imported".format(file_count))
+        self.__connection.commit()
+
+    def __import_sequential(self, cursor, fpaths, options, sources, imported_tables, delta=False):
         file_count = 0
-        for fpath in self.__dbf_files(dbf_path):
+        for fpath in fpaths:
             file_count += 1
             self.__logger.info("import dbf file #{}: {}".format(file_count, fpath))
-            dbf_table = dbfread.DBF(fpath, lowernames=lowernames, encoding=encoding,
-                                char_decode_errors=char_decode_errors)
-            SQLiteConverterWorker(self.__logger, cursor, dbf_table).import_dbf_file()
+            dbf_table = dbfread.DBF(fpath, lowernames=options.lowernames, encoding=options.encoding,
+                                char_decode_errors=options.char_decode_errors)
+            if delta and _DBFReader.supports(dbf_table, options.columns.get(dbf_table.name)):
+                imported, deleted_recnos = self.__import_delta(cursor, fpath, dbf_table, options, sources)
+                imported_records = dbf_table.header.numrecords
+            else:
+                imported = self.__worker(cursor, dbf_table, _native_rows(dbf_table, options), options).import_dbf_file()
+                imported_records, deleted_recnos = None, ()
+            if imported:
+                imported_tables.append((fpath, dbf_table))
+            if imported and sources is not None:
+                sources.register(fpath, dbf_table.name, dbf_table.header.recordlen, imported_records,
+                                 _table_options_key(options, dbf_table.name, delta), deleted_recnos)
+        return file_count
 
-        if file_count:
-            self.__logger.info("{} file(s) imported".format(file_count))
-            self.__connection.commit()
-        else:
-            message = "no dbf file in {}".format(dbf_path)
-            self.__logger.warning(message)
+    def __import_delta(self, cursor, fpath, dbf_table, options, sources):
+        """Return (imported, deleted recnos)"""
+        reader = _DBFReader(dbf_table, use_mmap=options.use_mmap, columns=options.columns.get(dbf_table.name),
+                            trim=options.narrow_types)
+        options_key = _table_options_key(options, dbf_table.name, True)
+        start = sources.imported_records(fpath, dbf_table.header.recordlen, options_key)
+        deleted_recnos = reader.deleted_recnos()
+        if start is None or start > dbf_table.header.numrecords:
+            worker = self.__worker(cursor, dbf_table, reader.records(with_recno=True), options, recno=True)
+            return worker.import_dbf_file(), deleted_recnos
+
+        # the records deleted at the last import and recalled since are imported again
+        recalled_recnos = sorted(set(sources.deleted_recnos(fpath)) - set(deleted_recnos))
+        if recalled_recnos:
+            self.__logger.info("import {} recalled record(s) of {}".format(len(recalled_recnos), fpath))
+        rows = itertools.chain(((recno,) + reader.record(recno) for recno in recalled_recnos),
+                               reader.records(start, with_recno=True))
+        self.__logger.info("append records {}..{} of {}".format(start, dbf_table.header.numrecords, fpath))
+        worker = self.__worker(cursor, dbf_table, rows, options, recno=True)
+        return worker.append_dbf_records([recno for recno in deleted_recnos if recno < start]), deleted_recnos
+
+    def __import_parallel(self, cursor, fpaths, options, workers, sources, imported_tables):
+        # the sqlite3 connection is not shared: the processes decode chunks of
+        # records, this thread writes them in order (and filters and reports:
+        # the python functions may not be picklable). At most 2 * workers chunks
+        # are in flight, whatever the size of the tables
+        file_count = 0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = _bounded_submit(pool, self.__chunk_tasks(fpaths, options), 2 * workers)
+            for (fpath, dbf_table), file_chunks in itertools.groupby(chunks, key=lambda chunk: chunk[:2]):
+                file_count += 1
+                self.__logger.info("import dbf file #{}: {}".format(file_count, fpath))
+                futures = [future for _, _, future in file_chunks]
+                if futures[0] is None:
+                    rows = None # read by dbfread in this thread
+                else:
+                    rows = itertools.chain.from_iterable(future.result() for future in futures)
+                imported = self.__worker(cursor, dbf_table, rows, options).import_dbf_file()
+                if imported:
+                    imported_tables.append((fpath, dbf_table))
+                if imported and sources is not None:
+                    sources.register(fpath, dbf_table.name, options_key=_table_options_key(options, dbf_table.name, False))
+        return file_count
+
+    def __chunk_tasks(self, fpaths, options):
+        """yield (fpath, dbf table, function, args) for every chunk of records of
+        the files, or (fpath, dbf table, None, None) for a file read by dbfread"""
+        decode_options = options._replace(where={}, progress=None)
+        for fpath in fpaths:
+            dbf_table = dbfread.DBF(fpath, lowernames=options.lowernames, encoding=options.encoding,
+                                    char_decode_errors=options.char_decode_errors)
+            if not _DBFReader.supports(dbf_table, options.columns.get(dbf_table.name)):
+                yield fpath, dbf_table, None, None
+                continue
+            starts = range(0, max(1, dbf_table.header.numrecords), _PARALLEL_CHUNK_SIZE)
+            for start in starts:
+                # the last chunk reads up to the end of file marker, as the sequential import
+                stop = start + _PARALLEL_CHUNK_SIZE if start != starts[-1] else None
+                yield fpath, dbf_table, _decode_dbf_records, (fpath, decode_options, start, stop)
+
+    def __worker(self, cursor, dbf_table, rows, options, recno=False):
+        return SQLiteConverterWorker(self.__logger, cursor, dbf_table, rows, recno=recno,
+                                     columns=options.columns.get(dbf_table.name), where=options.where.get(dbf_table.name),
+                                     batch_size=options.batch_size, batch_commit=options.batch_commit,
+                                     progress=options.progress, narrow_types=options.narrow_types,
+                                     sample_size=options.sample_size, strict=options.strict)
+
+    def __explicit_index_specs(self, indexes):
+        for table_name, index_columns in (indexes or {}).items():
+            for columns in index_columns:
+                if isinstance(columns, str):
+                    columns = [columns]
+                yield table_name, columns
+
+    def __companion_index_specs(self, imported_tables, options):
+        index_specs = []
+        for fpath, dbf_table in imported_tables:
+            columns = options.columns.get(dbf_table.name)
+            field_names = [f.name for f in dbf_table.fields if columns is None or f.name in columns]
+            for index_path in _companion_index_files(fpath):
+                try:
+                    expressions = _read_key_expressions(index_path)
+                except (ValueError, struct.error, IndexError) as err:
+                    self.__logger.warning("can't read index file {}: {}".format(index_path, err))
+                    continue
+                for expression in expressions:
+                    columns = _expression_columns(expression, field_names)
+                    if columns:
+                        index_specs.append((dbf_table.name, columns))
+                    else:
+                        self.__logger.info("ignore key expression {} of {}".format(expression, index_path))
+        return index_specs
 
     def __check_path(self, dbf_path):
         if not os.path.isdir(dbf_path):
             raise Exception("{} is not a directory".format(dbf_path))
 
 
-    def __dbf_files(self, dbf_path):
+    def dbf_files(self, dbf_path):
+        """Yield the paths of the dbf files of a directory and its subdirectories"""
         for root, _, names in os.walk(dbf_path):
             for name in names:
                 lext = os.path.splitext(name)[-1].lower()
@@ -65,8 +257,240 @@ class SQLiteConverter():
                     yield os.path.join(root, name)
 
 
+def create_index(cursor, table_name, columns, logger=logging.getLogger("sqliteondbf")):
+    """Create an index on the columns of a table, if it does not exist"""
+    index_name = "_".join([table_name] + list(columns) + ["idx"])
+    sql = 'CREATE INDEX IF NOT EXISTS "{}" ON "{}" ({})'.format(index_name, table_name,
+                                                              ", ".join('"{}"'.format(c) for c in columns))
+    logger.debug("create index SQL:\n{}".format(sql))
+    cursor.execute(sql)
+
+
+class _SourceRegistry():
+    """The registry of the imported dbf files, stored in the sqlite database. A
+    file is unchanged if its size, mtime and header fields are unchanged. For a
+    delta import, the registry stores the number of imported records, the key
+    of the import options and the records that were flagged as deleted"""
+    TABLE_NAME = "_sqliteondbf_sources"
+    # the columns added after the first version of the table
+    __DELTA_COLUMNS = (("options_key", "TEXT"), ("deleted_recnos", "TEXT"))
+
+    def __init__(self, logger, cursor):
+        self.__logger = logger
+        self.__cursor = cursor
+        self.__cursor.execute('CREATE TABLE IF NOT EXISTS "{}" (path TEXT PRIMARY KEY, table_name TEXT, '
+                              'size INTEGER, mtime REAL, numrecords INTEGER, last_update TEXT, '
+                              'recordlen INTEGER, imported_records INTEGER, options_key TEXT, '
+                              'deleted_recnos TEXT)'.format(_SourceRegistry.TABLE_NAME))
+        column_names = set(row[1] for row in self.__cursor.execute('PRAGMA table_info("{}")'.format(
+            _SourceRegistry.TABLE_NAME)))
+        for name, column_type in _SourceRegistry.__DELTA_COLUMNS:
+            if name not in column_names:
+                self.__cursor.execute('ALTER TABLE "{}" ADD COLUMN {} {}'.format(_SourceRegistry.TABLE_NAME, name,
+                                                                                  column_type))
+
+    def is_unchanged(self, fpath, options_key):
+        """return True if the file was imported with the same options (a None
+        key never matches) and did not change since"""
+        self.__cursor.execute('SELECT size, mtime, numrecords, last_update, options_key FROM "{}" WHERE path = ?'.format(
+            _SourceRegistry.TABLE_NAME), (os.path.abspath(fpath),))
+        row = self.__cursor.fetchone()
+        if row is None or tuple(row[:4]) != source_fingerprint(fpath):
+            return False
+        if options_key is None or row[4] != options_key:
+            self.__logger.info("the import options of {} changed".format(fpath))
+            return False
+        self.__logger.info("skip unchanged dbf file: {}".format(fpath))
+        return True
+
+    def imported_records(self, fpath, recordlen, options_key=None):
+        """return the number of records imported with a _recno column, or None
+        if the file has to be imported from scratch: the record length or the
+        import options changed"""
+        self.__cursor.execute('SELECT recordlen, imported_records, options_key FROM "{}" WHERE path = ?'.format(
+            _SourceRegistry.TABLE_NAME), (os.path.abspath(fpath),))
+        row = self.__cursor.fetchone()
+        if row is None or row[0] != recordlen:
+            return None
+        if options_key is None or row[2] != options_key:
+            self.__logger.info("the import options of {} changed: import the whole file".format(fpath))
+            return None
+        return row[1]
+
+    def deleted_recnos(self, fpath):
+        """return the numbers of the records flagged as deleted at the last
+        delta import"""
+        self.__cursor.execute('SELECT deleted_recnos FROM "{}" WHERE path = ?'.format(_SourceRegistry.TABLE_NAME),
+                              (os.path.abspath(fpath),))
+        row = self.__cursor.fetchone()
+        if row is None or not row[0]:
+            return []
+        return [int(recno) for recno in row[0].split(",")]
+
+    def register(self, fpath, table_name, recordlen=None, imported_records=None, options_key=None, deleted_recnos=()):
+        """register the file as imported"""
+        self.__cursor.execute('INSERT OR REPLACE INTO "{}" (path, table_name, size, mtime, numrecords, last_update, '
+                              'recordlen, imported_records, options_key, deleted_recnos) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'.format(_SourceRegistry.TABLE_NAME),
+                              (os.path.abspath(fpath), table_name) + source_fingerprint(fpath) +
+                              (recordlen, imported_records, options_key, ",".join(str(recno) for recno in deleted_recnos)))
+
+
+# the first SQLite version with STRICT tables
+STRICT_VERSION = (3, 37, 0)
+
+# the pragmas of the bulk load profile, in order: the page size must be set before the journal mode
+FAST_LOAD_PRAGMAS = collections.OrderedDict([
+    ("page_size", 16384),
+    ("journal_mode", "OFF"),
+    ("synchronous", "OFF"),
+    ("cache_size", -262144),
+    ("temp_store", "MEMORY"),
+    ("locking_mode", "EXCLUSIVE"),
+])
+
+
+@contextlib.contextmanager
+def bulk_load_profile(connection, logger=logging.getLogger("sqliteondbf"), pragmas=None):
+    """A context for the import: set the FAST_LOAD_PRAGMAS (updated by pragmas)
+    on the connection, then commit, restore the previous values, checkpoint the
+    WAL if the journal mode is WAL and run ANALYZE. The page size is kept"""
+    profile = collections.OrderedDict(FAST_LOAD_PRAGMAS)
+    profile.update(pragmas or {})
+    previous = collections.OrderedDict()
+    for name, value in profile.items():
+        previous[name] = connection.execute("PRAGMA {}".format(name)).fetchone()[0]
+        sql = "PRAGMA {} = {}".format(name, value)
+        logger.debug("bulk load profile SQL:\n{}".format(sql))
+        connection.execute(sql)
+    try:
+        yield connection
+    finally:
+        connection.commit()
+        wal = str(profile.get("journal_mode")).upper() == "WAL"
+        for name, value in reversed(previous.items()):
+            if name == "page_size" or name == "journal_mode" and wal:
+                continue
+            connection.execute("PRAGMA {} = {}".format(name, value))
+        if wal:
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("ANALYZE")
+        logger.debug("bulk load profile restored")
+
+
+def source_fingerprint(fpath):
+    """Return the size, the mtime, the record count and the last update date
+    (from the header) of a dbf file"""
+    stat = os.stat(fpath)
+    with open(fpath, 'rb') as infile:
+        year, month, day, numrecords = struct.unpack("<xBBBL", infile.read(8))
+    return stat.st_size, stat.st_mtime, numrecords, "{:02d}{:02d}{:02d}".format(year, month, day)
+
+
+def _table_name(fpath):
+    """Return the name of the table of a dbf file (as dbfread does)"""
+    return os.path.splitext(os.path.basename(fpath))[0].lower()
+
+
+def _table_options_key(options, table_name, delta=False):
+    """Return the key of the options that change the rows of a table, or None
+    if they can't be hashed (e.g. a python function)"""
+    try:
+        data = json.dumps([delta, options.lowernames, options.encoding, options.char_decode_errors,
+                           options.columns.get(table_name), options.where.get(table_name), options.narrow_types,
+                           options.sample_size, options.strict])
+    except TypeError:
+        return None
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+_ImportOptions = collections.namedtuple("_ImportOptions", ["lowernames", "encoding", "char_decode_errors", "use_mmap",
+                                                             "columns", "where", "batch_size", "batch_commit",
+                                                             "progress", "narrow_types", "sample_size", "strict"])
+
+
+class ImportProgress(collections.namedtuple("ImportProgress", ["table_name", "rows", "numrecords", "bytes", "seconds",
+                                                                 "done", "records"])):
+    """A progress event of the import of a table: the rows inserted so far, the
+    number of records of the dbf file, the bytes of the records read and the
+    elapsed time. done is True for the last event of the table. records is the
+    number of records read so far: with a where filter, it is greater than rows"""
+    __slots__ = ()
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return "{}: {}/{} records read, {} rows inserted, {:.0f} rows/s, {:.1f} MB/s{}".format(
+            self.table_name, self.records, self.numrecords, self.rows, self.rows_per_second,
+            self.bytes_per_second / 1e6, " (done)" if self.done else "")
+
+
+def _native_rows(dbf_table, options):
+    """Return the rows read by a DBFReader, or None if dbfread must be used"""
+    columns = options.columns.get(dbf_table.name)
+    if _DBFReader.supports(dbf_table, columns):
+        return _DBFReader(dbf_table, use_mmap=options.use_mmap, columns=columns, trim=options.narrow_types)
+    return None
+
+
+def _trimmed_rows(rows, fields):
+    """Trim and intern the character values of the rows read by dbfread"""
+    indices = [i for i, f in enumerate(fields) if f.type in 'CV']
+    intern = sys.intern
+
+    def trim(row):
+        row = list(row)
+        for i in indices:
+            if row[i] is not None:
+                row[i] = intern(row[i].strip())
+        return row
+
+    return map(trim, rows)
+
+
+# the number of records of a chunk decoded by a worker process
+_PARALLEL_CHUNK_SIZE = 1 << 14
+
+
+def _bounded_submit(pool, tasks, size):
+    """Submit the (key, key, function, args) tasks to the pool and yield the
+    (key, key, future) in order, with at most size futures in flight. A task
+    without function gives a None future"""
+    futures = collections.deque()
+    for key1, key2, function, args in tasks:
+        futures.append((key1, key2, None if function is None else pool.submit(function, *args)))
+        if len(futures) >= size:
+            yield futures.popleft()
+    while futures:
+        yield futures.popleft()
+
+
+def _decode_dbf_records(fpath, options, start, stop):
+    """Decode the active records start..stop (None: the end) of a dbf file in a
+    worker process and return the rows"""
+    dbf_table = dbfread.DBF(fpath, lowernames=options.lowernames, encoding=options.encoding,
+                            char_decode_errors=options.char_decode_errors)
+    reader = _DBFReader(dbf_table, use_mmap=options.use_mmap, columns=options.columns.get(dbf_table.name),
+                        trim=options.narrow_types)
+    records = reader.records(start, with_recno=True)
+    if stop is not None:
+        records = itertools.takewhile(lambda record: record[0] < stop, records)
+    return [record[1:] for record in records]
+
+
 class SQLiteConverterWorker():
-    """The worker: converts a dbf table and add the table to the current connection"""
+    """The worker: converts a dbf table and add the table to the current connection.
+    If columns is not None, only those fields are imported. where is a SQL
+    expression or a function (dict of values -> bool) that filters the rows.
+    If batch_size is not None, the rows are inserted by batches and the
+    progress is reported to the progress function (or logged) after every batch.
+    See SQLiteConverter.import_dbf_files for narrow_types, sample_size and strict"""
     __TYPEMAP = {
         'F': 'FLOAT',
         'L': 'BOOLEAN',
@@ -78,23 +502,87 @@ class SQLiteConverterWorker():
         'T': 'DATETIME',
         '0': 'INTEGER',
     }
+    # the types of a STRICT table: INT, INTEGER, REAL, TEXT, BLOB or ANY
+    __STRICT_TYPEMAP = {
+        'F': 'REAL',
+        'L': 'INTEGER',
+        'I': 'INTEGER',
+        'C': 'TEXT',
+        'N': 'REAL',
+        'M': 'TEXT',
+        'D': 'TEXT',
+        'T': 'TEXT',
+    }
+    # the longest numeric field that fits a 64 bits integer
+    __MAX_INTEGER_LENGTH = 18
 
-    def __init__(self, logger, cursor, dbf_table):
+    def __init__(self, logger, cursor, dbf_table, rows=None, recno=False, columns=None, where=None, batch_size=None,
+                 batch_commit=False, progress=None, narrow_types=False, sample_size=0, strict=False):
         self.__logger = logger
         self.__cursor = cursor
         self.__dbf_table = dbf_table
+        self.__rows = rows
+        self.__recno = recno
+        if columns is not None:
+            field_names = [f.name for f in dbf_table.fields]
+            unknown_columns = [c for c in columns if c not in field_names]
+            if unknown_columns:
+                raise Exception("unknown column(s) {} of table {}, the fields are {}".format(
+                    unknown_columns, dbf_table.name, field_names))
+        self.__fields = [f for f in dbf_table.fields if columns is None or f.name in columns]
+        self.__where = where
+        self.__batch_size = batch_size
+        self.__batch_commit = batch_commit
+        self.__progress = progress
+        self.__narrow_types = narrow_types
+        self.__sample_size = sample_size if narrow_types and not strict else 0
+        self.__strict = strict
+        self.__integral_names = set()
 
     def import_dbf_file(self):
-        """Import the file"""
+        """Import the file. Return False on error"""
         try:
             self.__add_sqlite_table()
         except UnicodeDecodeError as err:
             self.__logger.error("error {}".format(str(err)))
+            return False
+        return True
+
+    def append_dbf_records(self, deleted_recnos=()):
+        """Append the rows to the existing table, then delete the records by
+        record number (needs a _recno column). Return False on error"""
+        try:
+            self.__populate_table()
+            self.__delete_records(deleted_recnos)
+        except UnicodeDecodeError as err:
+            self.__logger.error("error {}".format(str(err)))
+            return False
+        return True
 
     def __add_sqlite_table(self):
+        values = None
+        if self.__sample_size:
+            values = iter(self.__values())
+            sample = list(itertools.islice(values, self.__sample_size))
+            self.__integral_names = self.__integral_field_names(sample)
+            values = itertools.chain(sample, values)
         self.__drop_table()
         self.__create_table()
-        self.__populate_table()
+        self.__populate_table(values)
+
+    def __integral_field_names(self, sample):
+        """the numeric fields with decimals whose values are integers"""
+        offset = 1 if self.__recno else 0
+        names = set()
+        for i, f in enumerate(self.__fields):
+            if f.type != 'N' or not f.decimal_count or f.length > SQLiteConverterWorker.__MAX_INTEGER_LENGTH:
+                continue
+            column = [row[i + offset] for row in sample if row[i + offset] is not None]
+            if column and all(isinstance(v, int) or isinstance(v, float) and v.is_integer() for v in column):
+                names.add(f.name)
+        if names:
+            self.__logger.debug("integral fields in the sample: {}".format(sorted(names)))
+        return names
 
     def __drop_table(self):
         sql = 'DROP TABLE IF EXISTS "{}"'.format(self.__dbf_table.name)
@@ -102,19 +590,99 @@ class SQLiteConverterWorker():
         self.__cursor.execute(sql)
 
     def __create_table(self):
-        fields = ['"{}" {}'.format(f.name, self.__field_type(f)) for f in self.__dbf_table.fields]
+        fields = ['"{}" {}'.format(f.name, self.__field_type(f)) for f in self.__fields]
+        if self.__recno:
+            fields.insert(0, '"_recno" INTEGER PRIMARY KEY')
         sql = 'CREATE TABLE "{}" ({})'.format(self.__dbf_table.name, ', '.join(fields))
+        if self.__strict:
+            sql += ' STRICT'
         self.__logger.debug("create table SQL:\n{}".format(sql))
         self.__cursor.execute(sql)
 
     def __field_type(self, f):
+        if self.__narrow_types and f.type == 'N':
+            if not f.decimal_count and f.length <= SQLiteConverterWorker.__MAX_INTEGER_LENGTH or f.name in self.__integral_names:
+                return 'INTEGER'
+            return 'REAL'
+        if self.__strict:
+            return SQLiteConverterWorker.__STRICT_TYPEMAP.get(f.type, 'ANY')
+        return SQLiteConverterWorker.column_type(f)
+
+    @staticmethod
+    def column_type(f):
+        """return the SQLite type of a dbf field"""
         return SQLiteConverterWorker.__TYPEMAP.get(f.type, 'TEXT')
 
-    def __populate_table(self):
-        placeholders = ", ".join(["?"] * len(self.__dbf_table.fields))
-        sql = 'INSERT INTO "{}" VALUES ({})'.format(self.__dbf_table.name, placeholders)
+    def __populate_table(self, values=None):
+        names = [f.name for f in self.__fields]
+        if self.__recno:
+            names.insert(0, "_recno")
+            insert = 'INSERT OR REPLACE INTO "{}"'.format(self.__dbf_table.name)
+        else:
+            insert = 'INSERT INTO "{}"'.format(self.__dbf_table.name)
+        if isinstance(self.__where, str):
+            # SQLite evaluates the predicate on the bound values
+            aliases = ", ".join('? AS "{}"'.format(name) for name in names)
+            sql = '{} SELECT * FROM (SELECT {}) WHERE {}'.format(insert, aliases, self.__where)
+        else:
+            sql = '{} VALUES ({})'.format(insert, ", ".join(["?"] * len(names)))
         self.__logger.debug("populate table SQL:\n{}".format(sql))
 
-        values = (list(rec.values()) for rec in self.__dbf_table)
-        self.__cursor.executemany(sql, values)
+        if values is None:
+            values = self.__values()
+        where = self.__where if callable(self.__where) else None
+        if self.__batch_size is None:
+            if where is not None:
+                values = (v for v in values if where(dict(zip(names, v))))
+            self.__cursor.executemany(sql, values)
+            self.__logger.debug("rowcount: {}".format(self.__cursor.rowcount))
+        else:
+            self.__populate_by_batches(sql, values, names, where)
+
+    def __values(self):
+        if self.__rows is not None:
+            return self.__rows
+        elif len(self.__fields) == len(self.__dbf_table.fields):
+            values = (list(rec.values()) for rec in self.__dbf_table)
+        else:
+            values = ([rec[f.name] for f in self.__fields] for rec in self.__dbf_table)
+        if self.__narrow_types:
+            values = _trimmed_rows(values, self.__fields)
+        return values
+
+    def __populate_by_batches(self, sql, values, names, where=None):
+        # at most batch_size records are in memory; the bytes are the bytes of
+        # the dbf records read, even if some fields are not imported. The rows
+        # are counted after the filter: a SQL where is applied by SQLite
+        header = self.__dbf_table.header
+        values = iter(values)
+        start = time.perf_counter()
+        records, rows = 0, 0
+        while True:
+            batch = list(itertools.islice(values, self.__batch_size))
+            if not batch:
+                break
+            records += len(batch)
+            if where is not None:
+                batch = [v for v in batch if where(dict(zip(names, v)))]
+            if batch:
+                self.__cursor.executemany(sql, batch)
+                rows += self.__cursor.rowcount
+            if self.__batch_commit:
+                self.__cursor.connection.commit()
+            self.__report(ImportProgress(self.__dbf_table.name, rows, header.numrecords, records * header.recordlen,
+                                         time.perf_counter() - start, False, records))
+        self.__report(ImportProgress(self.__dbf_table.name, rows, header.numrecords, records * header.recordlen,
+                                     time.perf_counter() - start, True, records))
+
+    def __report(self, progress):
+        if self.__progress is None:
+            self.__logger.info("import progress {}".format(progress))
+        else:
+            self.__progress(progress)
+
+    def __delete_records(self, deleted_recnos):
+        sql = 'DELETE FROM "{}" WHERE "_recno" = ?'.format(self.__dbf_table.name)
+        self.__logger.debug("delete records SQL:\n{}".format(sql))
+        self.__cursor.executemany(sql, ((recno,) for recno in deleted_recnos))
         self.__logger.debug("rowcount: {}".format(self.__cursor.rowcount))
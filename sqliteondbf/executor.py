@@ -18,14 +18,38 @@
 # * A part of this tool was inspired by https://github.com/olemb/dbfread/blob/master/examples/dbf2sqlite by Ole Martin Bjørndalen / UiT The Arctic University of Norway (under MIT licence)
 # * The example files are adapted from https://www.census.gov/data/tables/2016/econ/stc/2016-annual.html (I didn't find a copyright, but this is fair use I believe)
 
+import concurrent.futures
+import contextlib
 import logging
+import os
+import re
 import sqlite3
 import csv
+import gzip
 import sys
 import io
+import subprocess
+import urllib.request
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 from sqliteondbf.splitter import Splitter as _Splitter
-from sqliteondbf.converter import SQLiteConverter as _SQLiteConverter
+from sqliteondbf.columnar import FORMAT_BY_EXTENSION as _FORMAT_BY_EXTENSION, declared_types as _declared_types, \
+    write_columnar as _write_columnar
+from sqliteondbf.lazy import LazyConnection as _LazyConnection
+from sqliteondbf.cache import ConversionCache as _ConversionCache, ResultCache as _ResultCache
+from sqliteondbf.profiler import query_plan as _query_plan
+from sqliteondbf.udf import define_function as _define_function, define_aggregate as _define_aggregate, \
+    register_batch_aggregates as _register_batch_aggregates, numpy as _numpy
+from sqliteondbf.converter import SQLiteConverter as _SQLiteConverter, bulk_load_profile as _bulk_load_profile, \
+    create_index as _create_index
+
+# the options that never take the next argument as value: `--flag`, or
+# `--pager=command` for the pager
+_FLAG_OPTIONS = {"mmap", "incremental", "delta", "fast_load", "lazy", "batch_commit", "narrow_types", "strict", "pager"}
 
 def query_required(func):
     def wrapper(self, *args, **kwargs):
@@ -50,13 +74,24 @@ def connection_required(func):
     return wrapper
 
 class SQLiteExecutor():
-    """A script executor: executes a sqlite script on a dbf database"""
-    def __init__(self, script, logger=logging.getLogger("sqliteondbf"), additional_instruction_by_name={}):
+    """A script executor: executes a sqlite script on a dbf database. If
+    profiler is a ScriptProfiler, every instruction is measured. If
+    cache_results is True, the result of a query is captured the first time
+    it is read, and the next $view or $export replay it instead of running
+    the query again"""
+    def __init__(self, script, logger=logging.getLogger("sqliteondbf"), additional_instruction_by_name={}, code_cache_dir=None,
+                 profiler=None, cache_results=False):
         if type(script) == str:
             self.__script = io.StringIO(script)
         else:
             self.__script = script
         self.__logger = logger
+        self.__code_cache_dir = code_cache_dir
+        self.__profiler = profiler
+        self.__cache_results = cache_results
+        self.__result_cache = None
+        # the functions and aggregates of the script share their globals
+        self.__udf_namespace = {}
         self.__instruction_by_name = {
             "connect":self.__connect,
             "convert":self.__convert,
@@ -66,6 +101,7 @@ class SQLiteExecutor():
             "view":self.__view,
             "aggregate":self.__aggregate,
             "dump":self.__dump,
+            "index":self.__index,
         }
         self.__instruction_by_name.update(additional_instruction_by_name)
 
@@ -76,137 +112,494 @@ class SQLiteExecutor():
             if not e:
                 continue
 
-            if e.startswith("$"):
-                args = self.__get_args(e[1:]) # get arg
-                self.__instruction_by_name[args[0]](e[1:], *(args[1:]))
-            elif e.startswith("/*") or e.startswith("--"):
-                self.__logger.debug("ignore:\n{}".format(e))
+            if self.__profiler is None:
+                self.__execute_instruction(e)
             else:
-                try:
-                    self.__cursor
-                except:
-                    msg = "open a data source before executing SQL instructions!! {} ignored".format(e)
-                    self.__logger.error(msg)
-                    raise Exception(msg)
-                else:
-                    self.__last_query, self.__cursor_fetched = e, False
-                    self.__logger.debug("execute sql:\n{}".format(e))
-                    self.__cursor.execute(e)
-                    self.__logger.debug("rowcount: {}".format(self.__cursor.rowcount))
+                with self.__profiler.measure(e) as entry:
+                    self.__execute_instruction(e, entry)
+
+    def __execute_instruction(self, e, entry=None):
+        if e.startswith("$"):
+            args, options = self.__get_options(self.__get_args(e[1:])) # get arg
+            self.__instruction_by_name[args[0]](e[1:], *(args[1:]), **options)
+        elif e.startswith("/*") or e.startswith("--"):
+            self.__logger.debug("ignore:\n{}".format(e))
+        else:
+            try:
+                self.__cursor
+            except:
+                msg = "open a data source before executing SQL instructions!! {} ignored".format(e)
+                self.__logger.error(msg)
+                raise Exception(msg)
+            else:
+                self.__last_query, self.__cursor_fetched = e, False
+                if entry is not None:
+                    entry["plan"] = _query_plan(self.__connection, e)
+                self.__logger.debug("execute sql:\n{}".format(e))
+                if self.__result_cache is not None:
+                    # a new statement: no statement should be pending to drop the cached result
+                    self.__cursor.close()
+                    self.__cursor = self.__connection.cursor()
+                    self.__result_cache.clear()
+                self.__cursor.execute(e)
+                if self.__result_cache is not None and self.__cursor.description is not None:
+                    self.__result_cache.start(self.__cursor)
+                self.__logger.debug("rowcount: {}".format(self.__cursor.rowcount))
+                if entry is not None:
+                    entry["rows"] = self.__cursor.rowcount
 
-    def __connect(self, e, t, fpath, encoding="cp850"):
+    def __connect(self, e, t, fpath, encoding="cp850", jobs=1, mmap=False, fast_load=False, lazy=False, columns=None, where=None,
+                  batch_size=None, batch_commit=False, cache_dir=None, cache_size=None, narrow_types=False, sample_size=0,
+                  strict=False):
         self.__logger.info("set source to {} ({})".format(fpath, t))
         if t == "sqlite":
             self.__connection = sqlite3.connect(fpath)
         elif t == "dbf":
-            self.__connection = convert(fpath, ":memory:", logger=self.__logger, encoding=encoding)
+            self.__connection = connect(fpath, logger=self.__logger, encoding=encoding, workers=int(jobs), use_mmap=bool(mmap),
+                                        fast_load=bool(fast_load), lazy=bool(lazy), columns=self.__table_columns(columns),
+                                        where=self.__table_options(where), batch_size=self.__batch_size(batch_size),
+                                        batch_commit=bool(batch_commit), cache_dir=cache_dir, cache_size=cache_size,
+                                        narrow_types=bool(narrow_types), sample_size=int(sample_size), strict=bool(strict))
         else:
             raise Exception ("bad kw")
+        self.__register_functions()
         self.__cursor = self.__connection.cursor()
+        self.__result_cache = _ResultCache(self.__connection, self.__logger) if self.__cache_results else None
 
-    def __convert(self, e, dbf_path, sqlite_path, encoding="cp850"):
-        self.__connection = convert(dbf_path, sqlite_path, logger=self.__logger, encoding=encoding)
+    def __convert(self, e, dbf_path, sqlite_path, encoding="cp850", jobs=1, mmap=False, incremental=False, delta=False,
+                  fast_load=False, columns=None, where=None, batch_size=None, batch_commit=False, narrow_types=False, sample_size=0,
+                  strict=False):
+        self.__connection = convert(dbf_path, sqlite_path, logger=self.__logger, encoding=encoding, workers=int(jobs), use_mmap=bool(mmap),
+                                    incremental=bool(incremental), delta=bool(delta), fast_load=bool(fast_load),
+                                    columns=self.__table_columns(columns), where=self.__table_options(where),
+                                    batch_size=self.__batch_size(batch_size), batch_commit=bool(batch_commit),
+                                    narrow_types=bool(narrow_types), sample_size=int(sample_size), strict=bool(strict))
+        self.__register_functions()
         self.__cursor = self.__connection.cursor()
+        self.__result_cache = _ResultCache(self.__connection, self.__logger) if self.__cache_results else None
 
     @query_required
-    def __export(self, e, csv_path):
-        self.__ensure_cursor()
+    def __export(self, e, path, format=None, compression=None, dialect="excel", partitions=None, by="rowid"):
+        query = self.__last_query
 
-        export(self.__cursor, csv_path, self.__logger)
+        file_format = format or export_format(path)
+        if file_format == "csv":
+            types = None
+        else:
+            types = _declared_types(self.__connection, query)
+        if partitions is not None:
+            export_partitions(self.__connection, query, path, int(partitions), by, self.__logger,
+                              format=file_format, types=types, compression=compression, dialect=dialect)
+            return
 
-    @connection_required
-    def __def(self, e, *args):
-        import re
-        from inspect import signature
+        cursor = self.__ensure_cursor()
+        export(cursor, path, self.__logger, format=file_format, types=types, compression=compression, dialect=dialect)
 
+    @connection_required
+    def __def(self, e, *args, **options):
         self.__logger.debug("define function python code:\n{}".format(e))
-        m = re.match("^def\s+(.+)\s*\(.*$", e, re.MULTILINE)
-        name = m.group(1)
-        o = compile(e, "self.__script", "exec")
-        exec(o)
-        func = locals()[name]
-        sig = signature(func)
-        params = sig.parameters
-
-        self.__connection.create_function(name, len(params), func)
+        self.__release_cursor()
+        _define_function(self.__connection, e, self.__udf_namespace, self.__code_cache_dir, self.__logger)
 
     @connection_required
-    def __aggregate(self, e, *args):
-        import re
-        from inspect import signature
-
+    def __aggregate(self, e, *args, **options):
         self.__logger.debug("define aggregate function python code:\n{}".format(e))
-        m = re.match("^aggregate\s+(.+)\s*\(.*$", e, re.MULTILINE)
-        name = m.group(1)
-        o = compile("class"+e[len("aggregate"):], "self.__script", "exec")
-        exec(o)
-        clazz = locals()[name]
-        sig = signature(clazz.step)
-        params = sig.parameters
+        self.__release_cursor()
+        _define_aggregate(self.__connection, e, self.__udf_namespace, self.__code_cache_dir, self.__logger)
 
-        self.__connection.create_aggregate(name, len(params)-1, clazz)
+    @connection_required
+    def __index(self, e, *args, **options):
+        if options:
+            raise Exception("bad index: {}, $index takes no option ({})".format(
+                e, ", ".join("--" + name.replace("_", "-") for name in options)))
+        m = re.match(r'^index\s+(?:"([^"]+)"|([^\s(]+))\s*\(([^)]*)\)\s*$', e)
+        if not m:
+            raise Exception("bad index: {}, expected $index table(col1, col2, ...)".format(e))
+        table_name = m.group(1) or m.group(2)
+        columns = [c.strip().strip('"') for c in m.group(3).split(",")]
+        _create_index(self.__cursor, table_name, columns, self.__logger)
 
     @query_required
-    def __view(self, e, *args):
-        self.__ensure_cursor()
+    def __view(self, e, *args, pager=None, sample_size=1000):
+        cursor = self.__ensure_cursor()
 
         if args:
             limit = int(args[0])
         else:
             limit = 100
-        view(self.__cursor, limit, self.__logger)
+        view(cursor, limit, self.__logger, sample_size=int(sample_size), pager=pager)
 
     def __print(self, e, *args):
         print (*args)
 
-    def __dump(self, e, *args):
-        dump(args[0], self.__connection)
+    def __dump(self, e, *args, format="sql", compression=None):
+        dump(args[0], self.__connection, self.__logger, format=format, compression=compression)
+
+    def __register_functions(self):
+        if _numpy is not None:
+            _register_batch_aggregates(self.__connection)
+
+    def __release_cursor(self):
+        """SQLite can't replace a function (e.g. the builtin median) while a
+        query is pending: close the cursor, the query will be rerun if needed"""
+        if self.__result_cache is not None:
+            self.__result_cache.complete()
+        if self.__cursor.description is not None:
+            self.__cursor.close()
+            self.__cursor = self.__connection.cursor()
+            self.__cursor_fetched = True
 
     def __ensure_cursor(self):
+        """Return a cursor on the result of the last query: rerun the query if
+        it was already fetched, unless the result is cached"""
+        if self.__result_cache is not None:
+            cursor = self.__result_cache.cursor()
+            if cursor is not None:
+                return cursor
         if self.__cursor_fetched:
             self.__cursor.execute(self.__last_query)
         self.__cursor_fetched = True
+        return self.__cursor
 
     def __get_args(self, e):
         import shlex
         return shlex.split(e)
 
-def connect(dbf_path, logger=logging.getLogger("sqliteondbf"), lowernames=True, encoding="cp850", char_decode_errors="strict"):
-    """take a dBase (= set of dbf files) directory and return a SQLite connection over the database"""
-    return convert(dbf_path, ":memory:", logger=logger, lowernames=lowernames, encoding=encoding, char_decode_errors=char_decode_errors)
+    def __batch_size(self, value):
+        return None if value is None else int(value)
+
+    def __table_columns(self, values):
+        return self.__table_options(values, lambda value: [c.strip() for c in value.split(",")])
+
+    def __table_options(self, values, parse=lambda value: value):
+        """parse a (list of) `table:value` option(s) to a mapping table -> parsed value"""
+        if values is None:
+            return None
+        if not isinstance(values, list):
+            values = [values]
+        by_table = {}
+        for value in values:
+            table_name, sep, value = value.partition(":")
+            if not sep:
+                raise Exception("bad option value: {}, expected table:value".format(table_name))
+            by_table[table_name] = parse(value)
+        return by_table
+
+    def __get_options(self, args):
+        """split the args into positional args and --options. An option is
+        `--name value`, `--name=value` or a flag `--name` (a flag of
+        _FLAG_OPTIONS never takes the next argument)"""
+        positional, options = [], {}
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg.startswith("--") and len(arg) > 2:
+                name, sep, value = arg[2:].partition("=")
+                name = name.replace("-", "_")
+                if not sep:
+                    if name not in _FLAG_OPTIONS and i+1 < len(args) and not args[i+1].startswith("--"):
+                        i += 1
+                        value = args[i]
+                    else:
+                        value = True
+                if name in options:
+                    # a repeated option is a list
+                    if not isinstance(options[name], list):
+                        options[name] = [options[name]]
+                    options[name].append(value)
+                else:
+                    options[name] = value
+            else:
+                positional.append(arg)
+            i += 1
+        return positional, options
+
+def connect(dbf_path, logger=logging.getLogger("sqliteondbf"), lowernames=True, encoding="cp850", char_decode_errors="strict", workers=1, use_mmap=False,
+            fast_load=False, indexes=None, companion_indexes=True, lazy=False, columns=None, where=None, batch_size=None,
+            batch_commit=False, progress=None, cache_dir=None, cache_size=None, narrow_types=False, sample_size=0,
+            strict=False):
+    """take a dBase (= set of dbf files) directory and return a SQLite connection over the database.
+    If lazy is True, a table is imported the first time a statement references it.
+    If cache_dir is not None (and lazy is False), the converted database is stored in this directory and
+    reused while the dbf files and the options don't change. If cache_size (bytes or e.g. "2G") is not
+    None, the least recently used databases are removed when the directory is larger.
+    See convert for the other options"""
+    if cache_dir is not None and not lazy:
+        cache = _ConversionCache(cache_dir, cache_size, logger)
+        key = cache.key(dbf_path, lowernames=lowernames, encoding=encoding, char_decode_errors=char_decode_errors,
+                        indexes=indexes, companion_indexes=companion_indexes, columns=columns, where=where,
+                        narrow_types=narrow_types, sample_size=sample_size, strict=strict)
+        if key is None:
+            logger.info("the conversion options can't be cached")
+        else:
+            connection = sqlite3.connect(":memory:")
+            if cache.load(key, connection):
+                return connection
+            connection.close()
+            connection = connect(dbf_path, logger, lowernames, encoding, char_decode_errors, workers, use_mmap, fast_load,
+                                 indexes, companion_indexes, columns=columns, where=where, batch_size=batch_size,
+                                 batch_commit=batch_commit, progress=progress, narrow_types=narrow_types,
+                                 sample_size=sample_size, strict=strict)
+            cache.store(key, connection)
+            return connection
+    if lazy:
+        logger.info("register {}".format(dbf_path))
+        connection = sqlite3.connect(":memory:", factory=_LazyConnection)
+        connection.register_dbf(dbf_path, logger, lowernames=lowernames, encoding=encoding, char_decode_errors=char_decode_errors,
+                                use_mmap=use_mmap, indexes=indexes, companion_indexes=companion_indexes, columns=columns,
+                                where=where, batch_size=batch_size, batch_commit=batch_commit, progress=progress,
+                                narrow_types=narrow_types, sample_size=sample_size, strict=strict)
+        return connection
+    return convert(dbf_path, ":memory:", logger=logger, lowernames=lowernames, encoding=encoding, char_decode_errors=char_decode_errors, workers=workers, use_mmap=use_mmap,
+                   fast_load=fast_load, indexes=indexes, companion_indexes=companion_indexes, columns=columns, where=where,
+                   batch_size=batch_size, batch_commit=batch_commit, progress=progress, narrow_types=narrow_types,
+                   sample_size=sample_size, strict=strict)
 
-def convert(dbf_path, sqlite_path, logger=logging.getLogger("sqliteondbf"), lowernames=True, encoding="cp850", char_decode_errors="strict"):
-    """convert a dBase (= set of dbf files) directory to a SQLite file and return a SQLite connection over the database"""
+def convert(dbf_path, sqlite_path, logger=logging.getLogger("sqliteondbf"), lowernames=True, encoding="cp850", char_decode_errors="strict", workers=1, use_mmap=False, incremental=False,
+            delta=False, fast_load=False, indexes=None, companion_indexes=True, columns=None, where=None, batch_size=None,
+            batch_commit=False, progress=None, narrow_types=False, sample_size=0, strict=False):
+    """convert a dBase (= set of dbf files) directory to a SQLite file and return a SQLite connection over the database.
+    If workers > 1, the dbf files are decoded in parallel by a pool of processes.
+    If use_mmap is True, the dbf files are memory-mapped.
+    If incremental is True, the dbf files that did not change since the last conversion are skipped.
+    If delta is True, only the records appended since the last conversion are imported.
+    If fast_load is True (or a dict of pragmas), the import runs with the bulk load profile.
+    indexes is a mapping table name -> list of columns to index. If companion_indexes is True, the
+    key expressions of the .ndx/.mdx/.cdx files are indexed. The indexes are created after the import.
+    columns is a mapping table name -> list of columns to import, where is a mapping table name -> SQL
+    expression or python function (dict -> bool) that filters the rows.
+    If batch_size is not None, the rows are inserted by batches of batch_size rows, and the progress
+    (an ImportProgress) is logged or passed to the progress function after every batch. If batch_commit
+    is True, the transaction is committed after every batch.
+    If narrow_types is True, the numeric fields without decimals (or, if sample_size > 0, whose first
+    sample_size values are integers) are INTEGER columns, and the character values are trimmed.
+    If strict is True, the tables are STRICT tables"""
     logger.info("import {} to {}".format(dbf_path, sqlite_path))
     connection = sqlite3.connect(sqlite_path)
-    _SQLiteConverter(connection, logger).import_dbf(dbf_path, encoding=encoding, lowernames=lowernames, char_decode_errors=char_decode_errors)
+    converter = _SQLiteConverter(connection, logger)
+    kwargs = dict(encoding=encoding, lowernames=lowernames, char_decode_errors=char_decode_errors, workers=workers,
+                  use_mmap=use_mmap, incremental=incremental, delta=delta, indexes=indexes,
+                  companion_indexes=companion_indexes, columns=columns, where=where, batch_size=batch_size,
+                  batch_commit=batch_commit, progress=progress, narrow_types=narrow_types, sample_size=sample_size,
+                  strict=strict)
+    if fast_load:
+        with _bulk_load_profile(connection, logger, fast_load if isinstance(fast_load, dict) else None):
+            converter.import_dbf(dbf_path, **kwargs)
+    else:
+        converter.import_dbf(dbf_path, **kwargs)
     return connection
 
-def export(cursor, csv_path, logger=logging.getLogger("sqliteondbf")):
-    """export the result of the last query to a csv file"""
-    logger.info("export data to {}".format(csv_path))
-    with open(csv_path, 'w', newline='', encoding='utf-8') as dest:
-        writer = csv.writer(dest)
+def export_format(path):
+    """return the export format of a file: parquet, arrow or csv"""
+    return _FORMAT_BY_EXTENSION.get(os.path.splitext(path)[-1].lower(), "csv")
+
+_COMPRESSION_BY_EXTENSION = {".gz": "gzip", ".zst": "zstd"}
+
+def export(cursor, csv_path, logger=logging.getLogger("sqliteondbf"), format=None, types=None, compression=None,
+           dialect="excel", batch_size=1 << 14, buffer_size=1 << 20):
+    """export the result of the last query to a csv file, or to a parquet or
+    arrow file (format or extension .parquet, .arrow). The columnar formats
+    need pyarrow: the rows are written by batches, with the SQLite types of
+    the columns if types is not None (see sqliteondbf.columnar.declared_types).
+
+    The csv rows are fetched and written by batches of batch_size rows, through
+    a buffer of buffer_size bytes. compression is gzip or zstd (needs
+    zstandard), default: by the extension (.gz, .zst). dialect is a csv
+    dialect or the name of a registered dialect (excel, excel-tab, unix)"""
+    file_format = format or export_format(csv_path)
+    logger.info("export data to {} ({})".format(csv_path, file_format))
+    if file_format != "csv":
+        _write_columnar(cursor, csv_path, file_format, types, logger=logger)
+        return
+
+    if compression is None:
+        compression = _COMPRESSION_BY_EXTENSION.get(os.path.splitext(csv_path)[-1].lower())
+    with _open_text(csv_path, compression, buffer_size) as dest:
+        writer = csv.writer(dest, dialect=dialect)
         writer.writerow([description[0] for description in cursor.description])
-        for row in cursor:
-            writer.writerow(row)
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            writer.writerows(rows)
+            rows = cursor.fetchmany(batch_size)
+
+def export_partitions(connection, query, path_pattern, partitions, by="rowid", logger=logging.getLogger("sqliteondbf"),
+                      workers=None, **kwargs):
+    """export the result of a query to partitions files: the * of the
+    path_pattern is replaced by the number of the partition. The rows are
+    split by ranges of the column by of the result (e.g. `SELECT rowid, ...`
+    and by="rowid"), and the NULL keys go to the first partition. The column
+    must be in the result and not entirely NULL.
+
+    If the database is a file, the current transaction is committed and every
+    partition is exported by a pool of workers processes, on its own
+    read-only connection: the user functions of the connection are not
+    available. Otherwise (e.g. `$connect dbf` to :memory:), the partitions
+    are exported one after the other: the output is split, but not the work.
+    See export for the kwargs"""
+    if "*" not in path_pattern:
+        raise Exception("the path of a partitioned export needs a *: {}".format(path_pattern))
+    column_names = [description[0] for description in connection.execute('SELECT * FROM ({}) LIMIT 0'.format(query)).description]
+    if by not in column_names:
+        raise Exception("the partition column {} is not in the result {}: select it, e.g. `SELECT {}, ...`".format(
+            by, column_names, by))
+    column = '"{}"'.format(by.replace('"', '""'))
+    sql = 'SELECT * FROM ({}) WHERE {{}}'.format(query)
+    conditions = _partition_conditions(connection, query, column, partitions)
+    width = len(str(len(conditions) - 1))
+    jobs = [(sql.format(condition), params, path_pattern.replace("*", str(i).zfill(width)))
+            for i, (condition, params) in enumerate(conditions)]
+    logger.info("export data to {} partitions {}".format(len(jobs), path_pattern))
+
+    database = _database_file(connection)
+    if database is None:
+        logger.warning("in-memory database: the partitions are exported sequentially, in the same process")
+        for partition_sql, params, path in jobs:
+            export(connection.execute(partition_sql, params), path, logger, **kwargs)
+        return
+
+    connection.commit()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers or partitions) as pool:
+        futures = [pool.submit(_export_partition, database, partition_sql, params, path, kwargs)
+                   for partition_sql, params, path in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            logger.info("partition {} exported".format(future.result()))
+
+def _partition_conditions(connection, query, column, partitions):
+    """return the (condition, params) of every partition: equal ranges of
+    numbers, or quantiles of other values"""
+    lo, hi, count, row_count = connection.execute('SELECT MIN({0}), MAX({0}), COUNT({0}), COUNT(*) FROM ({1})'.format(
+        column, query)).fetchone()
+    if count == 0 and row_count > 0:
+        raise Exception("the partition column {} is NULL in every row".format(column))
+    if row_count == 0 or partitions <= 1:
+        return [("1", ())]
+    if isinstance(lo, (int, float)) and isinstance(hi, (int, float)):
+        step = (hi - lo) / partitions
+        bounds = [lo + step * k for k in range(1, partitions)]
+        if isinstance(lo, int) and isinstance(hi, int):
+            bounds = sorted(set(int(b) for b in bounds))
+    else:
+        bounds = [connection.execute('SELECT {0} FROM ({1}) WHERE {0} IS NOT NULL ORDER BY {0} LIMIT 1 OFFSET ?'.format(
+            column, query), (count * k // partitions,)).fetchone()[0] for k in range(1, partitions)]
+        bounds = sorted(set(bounds))
+    conditions = [("{0} < ? OR {0} IS NULL".format(column), (bounds[0],))]
+    conditions += [("{0} >= ? AND {0} < ?".format(column), (b1, b2)) for b1, b2 in zip(bounds, bounds[1:])]
+    conditions.append(("{} >= ?".format(column), (bounds[-1],)))
+    return conditions
+
+def _database_file(connection):
+    """return the file of the main database, or None for a in-memory database"""
+    for _, name, fpath in connection.execute("PRAGMA database_list"):
+        if name == "main":
+            return fpath or None
+    return None
+
+def _export_partition(database, sql, params, path, kwargs):
+    """export a partition in a worker process"""
+    connection = sqlite3.connect("file:{}?mode=ro".format(urllib.request.pathname2url(database)), uri=True)
+    try:
+        export(connection.execute(sql, params), path, **kwargs)
+    finally:
+        connection.close()
+    return path
+
+def _open_text(path, compression, buffer_size):
+    if compression is None:
+        return open(path, 'w', newline='', encoding='utf-8', buffering=buffer_size)
+    elif compression == "gzip":
+        # the default level 9 is much slower for a small gain
+        binary = io.BufferedWriter(gzip.GzipFile(path, 'wb', compresslevel=6), buffer_size)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise Exception("the zstd compression needs zstandard")
+        binary = io.BufferedWriter(zstandard.open(path, 'wb'), buffer_size)
+    else:
+        raise Exception("Unknown compression: {}".format(compression))
+    return io.TextIOWrapper(binary, newline='', encoding='utf-8')
+
+def view(cursor, limit, logger=logging.getLogger("sqliteondbf"), file=sys.stdout, sample_size=1000, batch_size=1000,
+         pager=None):
+    """print the result of the last query. The widths of the columns are
+    computed on the first sample_size rows, then the next rows are streamed by
+    batches of batch_size rows (a wider value is not truncated): the memory
+    doesn't depend on the size of the result. If limit == -1, print all the
+    rows.
+
+    If pager is not None, the rows are piped to a pager: a command, or True
+    for $PAGER (default: less -S). Quitting the pager stops the query"""
+    if pager is not None:
+        with _open_pager(pager) as pager_file:
+            try:
+                view(cursor, limit, logger, pager_file, sample_size, batch_size)
+            except BrokenPipeError: # the pager was closed
+                pass
+        return
 
-def view(cursor, limit, logger=logging.getLogger("sqliteondbf"), file=sys.stdout):
-    """print the result of the last query"""
     logger.debug("display data on terminal")
     column_names = [description[0] for description in cursor.description]
-    if limit >= 0:
-        rows = [r for _, r in zip(range(limit), cursor)]
-    else:
-        rows = [r for r in cursor]
-    ws = [max(len(str(y)) for y in col) for col in zip(column_names, *rows)]
-    for zs in (column_names, *rows):
-        print ("\t".join([str(z).rjust(w) if type(z) in (int, float) else str(z).ljust(w) for z, w in zip(zs, ws)]), file=file)
-    if cursor.fetchone():
-        print ("...", file=file)
-
-def dump(sqlite_path, connection):
-    """dump the database to a SQLite file"""
-    with open(sqlite_path, 'w', encoding="utf-8", newline="\n") as f:
-        for line in connection.iterdump():
-            f.write(line+"\n")
+    remaining = limit if limit >= 0 else None
+    # fetchmany(0) returns all the rows
+    rows = cursor.fetchmany(sample_size if remaining is None else min(sample_size, remaining)) if remaining != 0 else []
+    texts = [[str(z) for z in row] for row in rows]
+    ws = [max(len(y) for y in col) for col in zip(column_names, *texts)]
+
+    def format_row(row, texts=None):
+        if texts is None:
+            texts = [str(z) for z in row]
+        return "\t".join([text.rjust(w) if type(z) in (int, float) else text.ljust(w) for z, text, w in zip(row, texts, ws)])
+
+    file.write("\t".join([str(z).ljust(w) for z, w in zip(column_names, ws)]) + "\n")
+    while rows:
+        file.writelines([format_row(row, row_texts) + "\n" for row, row_texts in zip(rows, texts)])
+        if remaining is not None:
+            remaining -= len(rows)
+            if remaining <= 0:
+                break
+        rows = cursor.fetchmany(batch_size if remaining is None else min(batch_size, remaining))
+        texts = [None] * len(rows)
+    if remaining is not None and cursor.fetchone():
+        file.write("...\n")
+
+
+@contextlib.contextmanager
+def _open_pager(pager):
+    if pager is True:
+        pager = os.environ.get("PAGER") or ("more" if os.name == "nt" else "less -S")
+    process = subprocess.Popen(pager, shell=True, stdin=subprocess.PIPE, universal_newlines=True)
+    try:
+        yield process.stdin
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.wait()
+
+def dump(sqlite_path, connection, logger=logging.getLogger("sqliteondbf"), format="sql", compression=None, pages=4096,
+         progress=None):
+    """dump the database to a file. If format is sql, the file is the SQL text
+    of the database, compressed with gzip or zstd if compression is set or by
+    the extension (.gz, .zst). If format is binary, the file is a copy of the
+    database made by the backup API, pages pages at a time: progress is a
+    function (status, remaining, total) called after every step (default: log
+    the progress). A in-memory database is saved to a SQLite file this way"""
+    if isinstance(connection, _LazyConnection):
+        connection.load_all()
+    if format == "binary":
+        logger.info("copy the database to {}".format(sqlite_path))
+        if progress is None:
+            progress = lambda status, remaining, total: logger.debug("dump: {}/{} pages copied".format(total-remaining, total))
+        target = sqlite3.connect(sqlite_path)
+        try:
+            connection.backup(target, pages=pages, progress=progress)
+        finally:
+            target.close()
+        return
+    elif format != "sql":
+        raise Exception("Unknown dump format: {}".format(format))
+
+    if compression is None:
+        compression = _COMPRESSION_BY_EXTENSION.get(os.path.splitext(sqlite_path)[-1].lower())
+    logger.info("dump the database to {}".format(sqlite_path))
+    with _open_text(sqlite_path, compression, 1 << 20) as f:
+        f.writelines(line+"\n" for line in connection.iterdump())
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import os
+import re
+import struct
+
+_NDX_EXPRESSION_OFFSET = 24
+_MDX_TAG_TABLE_OFFSET = 544
+_MDX_TAG_ENTRY_SIZE = 32
+_PAGE_SIZE = 512
+_CDX_NODE_SIZE = 512
+
+# the functions that wrap a field in a key expression, without changing the order much
+_WRAPPER_RE = re.compile(r"^(?:UPPER|DTOS|STR|TRIM|RTRIM|LTRIM|ALLTRIM)\s*\(\s*([^,()]+?)\s*(?:,[^()]*)?\)$", re.IGNORECASE)
+_FIELD_RE = re.compile(r"^(?:\w+\s*->\s*)?(\w+)$")
+
+
+def companion_index_files(fpath):
+    """Return the index files of a dbf file: the production indexes (.mdx, .cdx)
+    with the same name and the .ndx files whose name starts with the table name"""
+    directory, name = os.path.split(fpath)
+    base = os.path.splitext(name)[0].lower()
+    try:
+        names = os.listdir(directory or ".")
+    except OSError:
+        return []
+
+    index_files = []
+    for other in sorted(names):
+        other_base, other_ext = os.path.splitext(other.lower())
+        if other_ext in (".mdx", ".cdx") and other_base == base or other_ext == ".ndx" and other_base.startswith(base):
+            index_files.append(os.path.join(directory, other))
+    return index_files
+
+
+def read_key_expressions(index_path, encoding="ascii"):
+    """Return the key expressions of an index file (.ndx, .mdx or .cdx)"""
+    with open(index_path, 'rb') as infile:
+        data = infile.read()
+    ext = os.path.splitext(index_path)[-1].lower()
+    if ext == ".ndx":
+        return [_c_string(data[_NDX_EXPRESSION_OFFSET:_NDX_EXPRESSION_OFFSET+100], encoding)]
+    elif ext == ".mdx":
+        return _mdx_key_expressions(data, encoding)
+    elif ext == ".cdx":
+        return _cdx_key_expressions(data, encoding)
+    raise ValueError("Unknown index file type: {}".format(index_path))
+
+
+def expression_columns(expression, field_names):
+    """Return the columns of a key expression like `FIELD1+UPPER(FIELD2)`, or
+    None if the expression can't be mapped to columns of the table"""
+    by_lower_name = {name.lower(): name for name in field_names}
+    columns = []
+    for part in expression.split("+"):
+        part = part.strip()
+        m = _WRAPPER_RE.match(part)
+        if m:
+            part = m.group(1)
+        m = _FIELD_RE.match(part)
+        if not m or m.group(1).lower() not in by_lower_name:
+            return None
+        columns.append(by_lower_name[m.group(1).lower()])
+    return columns
+
+
+def _c_string(data, encoding):
+    return data.split(b'\0', 1)[0].decode(encoding, "replace").strip()
+
+
+def _mdx_key_expressions(data, encoding):
+    # dBase IV: a table of tags, each tag has a header page with the key expression at 24
+    tag_count, = struct.unpack_from("<H", data, 28)
+    expressions = []
+    for i in range(tag_count):
+        entry = _MDX_TAG_TABLE_OFFSET + i * _MDX_TAG_ENTRY_SIZE
+        header_page, = struct.unpack_from("<L", data, entry)
+        offset = header_page * _PAGE_SIZE + _NDX_EXPRESSION_OFFSET
+        expressions.append(_c_string(data[offset:offset+100], encoding))
+    return expressions
+
+
+def _cdx_key_expressions(data, encoding):
+    # FoxPro: the first header is the tag directory, a B-tree whose keys are
+    # the tag names and whose record numbers are the offsets of the tag headers
+    root, = struct.unpack_from("<L", data, 0)
+    expressions = []
+    for offset in _cdx_leaf_record_numbers(data, root):
+        # the key expression pool is the second half of the tag header
+        expression_length, = struct.unpack_from("<H", data, offset + 510)
+        start = offset + _CDX_NODE_SIZE
+        expressions.append(_c_string(data[start:start+expression_length], encoding))
+    return expressions
+
+
+def _cdx_leaf_record_numbers(data, node):
+    attributes, count = struct.unpack_from("<HH", data, node)
+    if not attributes & 2:
+        # not a leaf: the tag directory of a real world file is a single leaf
+        raise ValueError("Unsupported cdx tag directory")
+
+    record_mask, = struct.unpack_from("<L", data, node + 14)
+    info_size = data[node + 23]
+    record_numbers = []
+    for i in range(count):
+        info = int.from_bytes(data[node + 24 + i * info_size:node + 24 + (i + 1) * info_size], "little")
+        record_numbers.append(info & record_mask)
+    return record_numbers
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import dbfread
+import logging
+import sqlite3
+
+from sqliteondbf.converter import SQLiteConverter as _SQLiteConverter, SQLiteConverterWorker as _SQLiteConverterWorker
+
+_ACCESS_ACTIONS = (sqlite3.SQLITE_READ, sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE)
+
+
+class LazyConnection(sqlite3.Connection):
+    """A connection over a dBase whose tables are imported on demand. register_dbf
+    creates an empty table for every dbf file. The first time a statement
+    references one of these tables, the dbf file is imported.
+
+    The referenced tables are found by compiling `EXPLAIN statement` with an
+    authorizer: the views and triggers are expanded by SQLite. Note that an
+    import commits the current transaction."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__pending_fpath_by_name = {}
+
+    def register_dbf(self, dbf_path, logger=logging.getLogger("sqliteondbf"), **kwargs):
+        """register the tables of a dBase directory. The kwargs are the options of
+        SQLiteConverter.import_dbf_files"""
+        self.__logger = logger
+        self.__converter = _SQLiteConverter(self, logger)
+        self.__kwargs = kwargs
+
+        cursor = sqlite3.Connection.cursor(self)
+        for fpath in self.__converter.dbf_files(dbf_path):
+            dbf_table = dbfread.DBF(fpath, lowernames=kwargs.get("lowernames", True), encoding=kwargs.get("encoding", "cp850"),
+                                    char_decode_errors=kwargs.get("char_decode_errors", "strict"))
+            columns = (kwargs.get("columns") or {}).get(dbf_table.name)
+            _SQLiteConverterWorker(logger, cursor, dbf_table, [], columns=columns).import_dbf_file()
+            self.__pending_fpath_by_name[dbf_table.name] = fpath
+        self.commit()
+        self.__logger.info("{} dbf file(s) registered".format(len(self.__pending_fpath_by_name)))
+
+    def pending_tables(self):
+        """return the names of the tables that are not imported yet"""
+        return sorted(self.__pending_fpath_by_name)
+
+    def load_tables(self, sql):
+        """import the pending tables referenced by a statement"""
+        if not self.__pending_fpath_by_name:
+            return
+
+        referenced, dropped = set(), set()
+        def authorizer(action, arg1, arg2, db_name, trigger_name):
+            if arg1 in self.__pending_fpath_by_name:
+                if action in _ACCESS_ACTIONS:
+                    referenced.add(arg1)
+                elif action == sqlite3.SQLITE_DROP_TABLE:
+                    dropped.add(arg1)
+            return sqlite3.SQLITE_OK
+
+        self.set_authorizer(authorizer)
+        try:
+            sqlite3.Connection.cursor(self).execute("EXPLAIN " + sql)
+        except (sqlite3.Error, sqlite3.Warning):
+            pass # the tables are known after compilation, even if the bindings are missing
+        finally:
+            # set_authorizer(None) removes the authorizer only from python 3.9
+            self.set_authorizer(_allow_all)
+
+        for name in dropped:
+            del self.__pending_fpath_by_name[name]
+        for name in sorted(referenced - dropped):
+            self.__load(name)
+
+    def load_all(self):
+        """import all the pending tables"""
+        for name in self.pending_tables():
+            self.__load(name)
+
+    def __load(self, name):
+        fpath = self.__pending_fpath_by_name.pop(name)
+        self.__logger.info("import table {} on demand".format(name))
+        kwargs = dict(self.__kwargs)
+        indexes = kwargs.get("indexes") or {}
+        kwargs["indexes"] = {name: indexes[name]} if name in indexes else None
+        self.__converter.import_dbf_files([fpath], **kwargs)
+
+    def cursor(self, factory=None):
+        return sqlite3.Connection.cursor(self, factory or LazyCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+class LazyCursor(sqlite3.Cursor):
+    """A cursor that imports the pending tables of a LazyConnection before the execution"""
+
+    def execute(self, sql, parameters=()):
+        self.connection.load_tables(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection.load_tables(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        self.connection.load_all()
+        return super().executescript(sql_script)
+
+
+def _allow_all(action, arg1, arg2, db_name, trigger_name):
+    return sqlite3.SQLITE_OK
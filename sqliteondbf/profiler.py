@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import contextlib
+import cProfile
+import json
+import pstats
+import sqlite3
+import time
+
+from sqliteondbf.udf import SCRIPT_FILENAME as _SCRIPT_FILENAME
+
+
+def query_plan(connection, sql):
+    """Return the counters of the EXPLAIN QUERY PLAN of a SQL statement: the
+    full scans, the sorts (temporary b-trees for ORDER BY, GROUP BY,
+    DISTINCT) and the automatic indexes, or None if the statement can't be
+    explained"""
+    try:
+        details = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN {}".format(sql))]
+    except sqlite3.Error:
+        return None
+    return {
+        "full_scans": sum(1 for d in details if d.startswith("SCAN ") and d != "SCAN CONSTANT ROW"),
+        "sorts": sum(1 for d in details if d.startswith("USE TEMP B-TREE")),
+        "autoindexes": sum(1 for d in details if "AUTOMATIC" in d),
+    }
+
+
+class ScriptProfiler():
+    """The time of every instruction of a script. The executor measures each
+    chunk yielded by the splitter, with the rows affected and the query plan
+    counters of the SQL statements.
+
+    Note that sqlite3 executes a SELECT lazily: most of the time of a query is
+    the time of the next instruction that fetches the rows ($view,
+    $export...).
+
+    If profile_udfs is True, the instructions run under cProfile and the
+    summary has the calls and times of the $def and $aggregate functions (this
+    slows down the execution)"""
+
+    def __init__(self, profile_udfs=False):
+        self.entries = []
+        self.__profile = cProfile.Profile() if profile_udfs else None
+
+    @contextlib.contextmanager
+    def measure(self, instruction):
+        """Measure an instruction. Yield the entry: a dict where the executor
+        may set the rows and the plan"""
+        entry = {"index": len(self.entries), "instruction": instruction, "seconds": None, "rows": None, "plan": None,
+                 "error": None}
+        self.entries.append(entry)
+        if self.__profile is not None:
+            self.__profile.enable()
+        start = time.perf_counter()
+        try:
+            yield entry
+        except Exception as e:
+            entry["error"] = "{}: {}".format(type(e).__name__, e)
+            raise
+        finally:
+            entry["seconds"] = time.perf_counter() - start
+            if self.__profile is not None:
+                self.__profile.disable()
+
+    def udf_stats(self):
+        """Return the calls and times of the user functions, by cumulative
+        time, or None if the udfs were not profiled"""
+        if self.__profile is None:
+            return None
+        if not self.entries:
+            return []
+        stats = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in pstats.Stats(self.__profile).stats.items():
+            if filename == _SCRIPT_FILENAME and name != "<module>":
+                stats.append({"name": name, "line": line, "calls": calls, "seconds": total, "cumulative_seconds": cumulative})
+        return sorted(stats, key=lambda stat: -stat["cumulative_seconds"])
+
+    def summary(self):
+        """Return the instructions ranked by time and the udf stats"""
+        return {
+            "total_seconds": sum(entry["seconds"] or 0 for entry in self.entries),
+            "instructions": sorted(self.entries, key=lambda entry: -(entry["seconds"] or 0)),
+            "udfs": self.udf_stats(),
+        }
+
+    def format_summary(self, limit=20, width=60):
+        """Return the summary as a text table (the limit slowest
+        instructions)"""
+        summary = self.summary()
+        total = summary["total_seconds"] or 1
+        lines = ["Total: {:.3f} s, {} instructions".format(summary["total_seconds"], len(self.entries)),
+                 "{:>4} {:>10} {:>6} {:>10} {:>6} {:>6} {:>8}  {}".format("#", "seconds", "%", "rows", "scans", "sorts", "autoidx",
+                                                                      "instruction")]
+        for entry in summary["instructions"][:limit]:
+            plan = entry["plan"] or {}
+            rows = entry["rows"]
+            instruction = " ".join(entry["instruction"].split())
+            if len(instruction) > width:
+                instruction = instruction[:width - 3] + "..."
+            if entry["error"]:
+                instruction += " [{}]".format(entry["error"])
+            lines.append("{:>4} {:>10.3f} {:>6.1%} {:>10} {:>6} {:>6} {:>8}  {}".format(
+                entry["index"], entry["seconds"], entry["seconds"] / total, "" if rows is None or rows < 0 else rows,
+                plan.get("full_scans", ""), plan.get("sorts", ""), plan.get("autoindexes", ""), instruction))
+        if summary["udfs"]:
+            lines.append("{:>10} {:>10} {:>10}  {}".format("calls", "seconds", "cumulative", "function"))
+            for stat in summary["udfs"]:
+                lines.append("{:>10} {:>10.3f} {:>10.3f}  {} (line {})".format(stat["calls"], stat["seconds"],
+                                                                              stat["cumulative_seconds"], stat["name"], stat["line"]))
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        """Write the summary to a JSON file"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=4)
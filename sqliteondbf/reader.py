@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import contextlib
+import datetime
+import mmap
+import struct
+import sys
+
+_ACTIVE = b' '
+_END_OF_FILE = b'\x1a'
+_JULIAN_OFFSET = 1721425
+
+
+class DBFReader():
+    """A fast reader of the records of a dbfread table. The header and the
+    field descriptors are parsed by dbfread, but the record area is read by
+    large blocks and unpacked with a struct. The fields are decoded column by
+    column and the records are yielded as tuples.
+
+    If columns is not None, the other fields are skipped by the struct and never
+    decoded. If trim is True, the leading spaces of the character fields are
+    removed too, and the values are interned: the repeated codes are shared.
+
+    If use_mmap is True, the file is memory-mapped once and the records are
+    unpacked from slices of the map, without intermediate copies.
+
+    Memo fields and other exotic types are not supported: use `supports` and
+    fall back to dbfread."""
+    __BLOCK_SIZE = 1 << 20
+
+    def __init__(self, dbf_table, block_size=__BLOCK_SIZE, use_mmap=False, columns=None, trim=False):
+        self.__dbf_table = dbf_table
+        self.__block_size = block_size
+        self.__use_mmap = use_mmap
+        self.__trim = trim
+        self.__fields = [f for f in dbf_table.fields if columns is None or f.name in columns]
+
+    @staticmethod
+    def supports(dbf_table, columns=None):
+        """return True if the records (or the columns) of this table can be read by a DBFReader"""
+        return not dbf_table.raw and all(f.type in _PARSER_BY_TYPE for f in dbf_table.fields
+                                         if columns is None or f.name in columns)
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, start=0, with_recno=False):
+        """yield the active records from the start-th record. If with_recno is
+        True, the record number is the first value of each record"""
+        header = self.__dbf_table.header
+        record_struct = self.__record_struct(header.recordlen)
+        parsers = [self.__parser(f) for f in self.__fields]
+        if self.__use_mmap:
+            blocks = self.__mmap_blocks
+        else:
+            blocks = self.__file_blocks
+        recno = start
+        for block in blocks(header, start):
+            records = list(record_struct.iter_unpack(block))
+            end = self.__end_index(records)
+            if end < len(records):
+                yield from self.__decode(records[:end], parsers, recno, with_recno)
+                break
+            yield from self.__decode(records, parsers, recno, with_recno)
+            recno += len(records)
+
+    def raw_records(self):
+        """yield (record number, field values) for the active records. The field
+        values are not decoded: see value_parsers"""
+        header = self.__dbf_table.header
+        record_struct = self.__record_struct(header.recordlen)
+        blocks = self.__mmap_blocks if self.__use_mmap else self.__file_blocks
+        recno = 0
+        for block in blocks(header, 0):
+            records = list(record_struct.iter_unpack(block))
+            end = self.__end_index(records)
+            for i, record in enumerate(records[:end]):
+                if record[0] == _ACTIVE:
+                    yield recno + i, record[1:]
+            if end < len(records):
+                break
+            recno += len(records)
+
+    def value_parsers(self):
+        """return a function bytes -> value for every field"""
+        return [self.__value_parser(f) for f in self.__fields]
+
+    def deleted_recnos(self, stop=None):
+        """return the numbers of the records flagged as deleted before the stop-th"""
+        header = self.__dbf_table.header
+        if stop is None:
+            stop = header.numrecords
+        with self.__mmap() as view:
+            stop = min(stop, max(0, len(view) - header.headerlen) // header.recordlen)
+            with view[header.headerlen:header.headerlen + stop * header.recordlen:header.recordlen] as flags:
+                flags = flags.tobytes()
+        flags = flags.split(_END_OF_FILE, 1)[0]
+        return [i for i, flag in enumerate(flags) if flag != _ACTIVE[0]]
+
+    def record(self, i):
+        """return the values of the i-th record (deleted or not). The file is
+        memory-mapped: the record offset is computed from the header"""
+        header = self.__dbf_table.header
+        if not 0 <= i < header.numrecords:
+            raise IndexError("record index out of range: {}".format(i))
+        record_struct = self.__record_struct(header.recordlen)
+        parsers = [self.__parser(f) for f in self.__fields]
+        offset = header.headerlen + i * header.recordlen
+        with self.__mmap() as view, view[offset:offset + header.recordlen] as data:
+            record = record_struct.unpack(data)
+        return tuple(parser([v])[0] for parser, v in zip(parsers, record[1:]))
+
+    def __file_blocks(self, header, start):
+        records_per_block = max(1, self.__block_size // header.recordlen)
+        with open(self.__dbf_table.filename, 'rb') as infile:
+            infile.seek(header.headerlen + start * header.recordlen, 0)
+            while True:
+                block = infile.read(records_per_block * header.recordlen)
+                count = len(block) // header.recordlen
+                if not count:
+                    break
+                yield memoryview(block)[:count * header.recordlen]
+
+    def __mmap_blocks(self, header, start):
+        # the record i is at headerlen + i * recordlen: slice the map without copy
+        block_len = max(1, self.__block_size // header.recordlen) * header.recordlen
+        with self.__mmap() as view:
+            count = max(0, len(view) - header.headerlen) // header.recordlen
+            end = header.headerlen + count * header.recordlen
+            for offset in range(header.headerlen + start * header.recordlen, end, block_len):
+                with view[offset:min(offset + block_len, end)] as block:
+                    yield block
+
+    @contextlib.contextmanager
+    def __mmap(self):
+        with open(self.__dbf_table.filename, 'rb') as infile, \
+                mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+
+    def __record_struct(self, recordlen):
+        fields = self.__dbf_table.fields
+        padding = recordlen - 1 - sum(f.length for f in fields)
+        if padding < 0:
+            raise ValueError("Record length {} is too small for the fields".format(recordlen))
+        formats = ["{}s".format(f.length) if f in self.__fields else "{}x".format(f.length) for f in fields]
+        return struct.Struct("<c" + "".join(formats) + "{}x".format(padding))
+
+    def __end_index(self, records):
+        for i, record in enumerate(records):
+            if record[0] == _END_OF_FILE:
+                return i
+        return len(records)
+
+    def __decode(self, records, parsers, first_recno, with_recno):
+        indices = [i for i, r in enumerate(records) if r[0] == _ACTIVE]
+        if not indices:
+            return iter(())
+        if len(indices) < len(records):
+            records = [records[i] for i in indices]
+        columns = [parser(column) for parser, column in zip(parsers, list(zip(*records))[1:])]
+        if with_recno:
+            columns.insert(0, [first_recno + i for i in indices])
+        return zip(*columns)
+
+    def __parser(self, field):
+        if field.type in 'CV':
+            encoding, errors = self.__dbf_table.encoding, self.__dbf_table.char_decode_errors
+            if self.__trim:
+                intern = sys.intern
+                return lambda column: [intern(v.strip(b'\0 ').decode(encoding, errors)) for v in column]
+            return lambda column: [v.rstrip(b'\0 ').decode(encoding, errors) for v in column]
+        parser = _PARSER_BY_TYPE[field.type]
+        return lambda column: list(map(parser, column))
+
+    def __value_parser(self, field):
+        if field.type in 'CV':
+            encoding, errors = self.__dbf_table.encoding, self.__dbf_table.char_decode_errors
+            return lambda v: v.rstrip(b'\0 ').decode(encoding, errors)
+        return _PARSER_BY_TYPE[field.type]
+
+
+def _parse_N(data):
+    data = data.strip().strip(b'*')
+    try:
+        return int(data)
+    except ValueError:
+        if not data.strip():
+            return None
+        return float(data.replace(b',', b'.'))
+
+def _parse_F(data):
+    data = data.strip().strip(b'*')
+    if data:
+        return float(data)
+    return None
+
+def _parse_D(data):
+    try:
+        return datetime.date(int(data[:4]), int(data[4:6]), int(data[6:8]))
+    except ValueError:
+        if data.strip(b' 0') == b'':
+            return None
+        raise ValueError('invalid date {!r}'.format(data))
+
+def _parse_L(data):
+    if data in b'TtYy':
+        return True
+    elif data in b'FfNn':
+        return False
+    elif data in b'? ':
+        return None
+    raise ValueError('Illegal value for logical field: {!r}'.format(data))
+
+def _parse_I(data):
+    return struct.unpack('<i', data)[0]
+
+def _parse_O(data):
+    return struct.unpack('d', data)[0]
+
+def _parse_T(data):
+    if data.strip():
+        day, msec = struct.unpack('<LL', data)
+        if day:
+            return datetime.datetime.fromordinal(day - _JULIAN_OFFSET) + datetime.timedelta(seconds=msec/1000)
+    return None
+
+def _parse_0(data):
+    return data
+
+# same semantics as dbfread.FieldParser; C and V are decoded by the reader
+_PARSER_BY_TYPE = {
+    'C': None,
+    'V': None,
+    'N': _parse_N,
+    'F': _parse_F,
+    'D': _parse_D,
+    'L': _parse_L,
+    'I': _parse_I,
+    '+': _parse_I,
+    'O': _parse_O,
+    'T': _parse_T,
+    '@': _parse_T,
+    '0': _parse_0,
+}
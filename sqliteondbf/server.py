@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import base64
+import contextlib
+import http.server
+import json
+import logging
+import os
+import queue
+import shutil
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+
+from sqliteondbf.columnar import declared_types as _declared_types, pyarrow as _pyarrow, write_columnar as _write_columnar
+from sqliteondbf.converter import SQLiteConverter as _SQLiteConverter
+from sqliteondbf.udf import numpy as _numpy, register_batch_aggregates as _register_batch_aggregates
+
+_JSON_TYPE = "application/json"
+_ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+_SOURCES_TABLE = "_sqliteondbf_sources"
+
+
+class ConnectionPool():
+    """A pool of read-only connections to a database file, shared by the
+    threads of the server"""
+
+    def __init__(self, database, size=4):
+        self.__connections = queue.LifoQueue()
+        uri = "file:{}?mode=ro".format(urllib.request.pathname2url(os.path.abspath(database)))
+        for _ in range(size):
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            if _numpy is not None:
+                _register_batch_aggregates(connection)
+            self.__connections.put(connection)
+        self.__size = size
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """A context that borrows a connection from the pool (waits at most
+        timeout seconds)"""
+        connection = self.__connections.get(timeout=timeout)
+        try:
+            yield connection
+        finally:
+            if connection.in_transaction:
+                connection.rollback()
+            self.__connections.put(connection)
+
+    def close(self):
+        for _ in range(self.__size):
+            self.__connections.get().close()
+
+
+class QueryServer():
+    """A read-only query server over a dBase directory. The dbf files are
+    converted once to a WAL database file (a temporary file if database is
+    None), the queries are executed by a pool of read-only connections and
+    answered over HTTP (TCP address or unix socket):
+
+    * GET /tables: the tables and their columns, as JSON;
+    * GET /query?sql=...[&format=json|arrow] or POST /query with a JSON object
+      {"sql": ..., "params": [...], "format": ...}: the result of the query,
+      as a JSON object {"columns": [...], "rows": [[...], ...]} or as an arrow
+      IPC stream (needs pyarrow). The rows are streamed.
+
+    If refresh_interval is not None, the changed dbf files are imported again
+    every refresh_interval seconds: a refresh is a single transaction (unless
+    batch_commit is True), the readers see the previous tables until the
+    commit. The options are the options of SQLiteConverter.import_dbf_files"""
+
+    def __init__(self, dbf_path, database=None, address=("127.0.0.1", 8765), unix_socket=None, pool_size=4,
+                 refresh_interval=None, logger=logging.getLogger("sqliteondbf"), **options):
+        self.__dbf_path = dbf_path
+        self.__logger = logger
+        self.__options = options
+        self.__temp_dir = None
+        if database is None:
+            self.__temp_dir = tempfile.mkdtemp(prefix="sqliteondbf")
+            database = os.path.join(self.__temp_dir, "base.db")
+        self.__database = database
+
+        self.__writer = sqlite3.connect(database, check_same_thread=False)
+        self.__writer.execute("PRAGMA journal_mode = WAL")
+        self.__refresh_lock = threading.Lock()
+        self.refresh()
+        self.__pool = ConnectionPool(database, pool_size)
+
+        if unix_socket is None:
+            self.__http_server = _ThreadingHTTPServer(address, _QueryHandler)
+        else:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            self.__http_server = _ThreadingUnixHTTPServer(unix_socket, _QueryHandler)
+        self.__http_server.query_server = self
+
+        self.__stopped = threading.Event()
+        self.__refresh_thread = None
+        if refresh_interval is not None:
+            self.__refresh_thread = threading.Thread(target=self.__refresh_loop, args=(refresh_interval,), daemon=True)
+            self.__refresh_thread.start()
+
+    @property
+    def server_address(self):
+        """The (host, port) or the unix socket of the server"""
+        return self.__http_server.server_address
+
+    @property
+    def pool(self):
+        return self.__pool
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    def refresh(self):
+        """Import the new or changed dbf files in a single transaction"""
+        with self.__refresh_lock:
+            self.__logger.info("refresh {} from {}".format(self.__database, self.__dbf_path))
+            self.__writer.execute("BEGIN")
+            try:
+                _SQLiteConverter(self.__writer, self.__logger).import_dbf(self.__dbf_path, incremental=True, **self.__options)
+            except Exception:
+                self.__writer.rollback()
+                raise
+            finally:
+                # e.g. no dbf file: the import didn't commit
+                if self.__writer.in_transaction:
+                    self.__writer.commit()
+
+    def serve_forever(self):
+        """Answer the requests until shutdown"""
+        self.__logger.info("serve {} on {}".format(self.__dbf_path, self.server_address))
+        self.__http_server.serve_forever()
+
+    def shutdown(self):
+        """Stop the server (from another thread) and remove the temporary
+        database"""
+        self.__stopped.set()
+        self.__http_server.shutdown()
+        self.__http_server.server_close()
+        if self.__refresh_thread is not None:
+            self.__refresh_thread.join()
+        self.__pool.close()
+        self.__writer.close()
+        if self.__temp_dir is not None:
+            shutil.rmtree(self.__temp_dir, ignore_errors=True)
+
+    def __refresh_loop(self, interval):
+        while not self.__stopped.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.__logger.error("refresh failed: {}".format(e))
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _QueryHandler(http.server.BaseHTTPRequestHandler):
+    """The requests of a QueryServer"""
+    server_version = "sqliteondbf"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == "/tables":
+            self.__tables()
+        elif url.path == "/query" and "sql" in params:
+            self.__query(params["sql"], [], params.get("format", "json"))
+        else:
+            self.__send_error(404, "unknown request: {}".format(self.path))
+
+    def do_POST(self):
+        if urllib.parse.urlsplit(self.path).path != "/query":
+            self.__send_error(404, "unknown request: {}".format(self.path))
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+            sql = request["sql"]
+        except (ValueError, KeyError, TypeError):
+            self.__send_error(400, 'expected a JSON object {"sql": ..., "params": [...], "format": ...}')
+            return
+        self.__query(sql, request.get("params", []), request.get("format", "json"))
+
+    def log_message(self, format, *args):
+        self.server.query_server.logger.debug("request: {}".format(format % args))
+
+    def __tables(self):
+        with self.server.query_server.pool.connection() as connection:
+            names = [row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name <> ? ORDER BY name", (_SOURCES_TABLE,))]
+            tables = {name: [[row[1], row[2]] for row in connection.execute('PRAGMA table_info("{}")'.format(name))]
+                      for name in names}
+        self.__send_json(200, tables)
+
+    def __query(self, sql, params, file_format):
+        if file_format not in ("json", "arrow"):
+            self.__send_error(400, "unknown format: {}".format(file_format))
+            return
+        if file_format == "arrow" and _pyarrow is None:
+            self.__send_error(400, "the arrow format needs pyarrow")
+            return
+        with self.server.query_server.pool.connection() as connection:
+            try:
+                cursor = connection.execute(sql, params)
+            except (sqlite3.Error, sqlite3.Warning, ValueError) as e:
+                self.__send_error(400, str(e))
+                return
+            try:
+                if cursor.description is None:
+                    self.__send_error(400, "not a query: {}".format(sql))
+                elif file_format == "json":
+                    self.__send_rows(cursor)
+                else:
+                    types = _declared_types(connection, sql)
+                    self.__send_headers(200, _ARROW_STREAM_TYPE)
+                    _write_columnar(cursor, self.wfile, "arrow_stream", types)
+            except (sqlite3.Error, BrokenPipeError, ConnectionResetError) as e:
+                # the status is already sent
+                self.server.query_server.logger.error("query failed: {}".format(e))
+            finally:
+                cursor.close()
+
+    def __send_rows(self, cursor, batch_size=1 << 12):
+        self.__send_headers(200, _JSON_TYPE)
+        self.wfile.write('{{"columns": {}, "rows": ['.format(
+            json.dumps([description[0] for description in cursor.description])).encode("utf-8"))
+        separator = "\n"
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            self.wfile.write((separator + ",\n".join(json.dumps(row, default=_json_default) for row in rows)).encode("utf-8"))
+            separator = ",\n"
+            rows = cursor.fetchmany(batch_size)
+        self.wfile.write(b"\n]}\n")
+
+    def __send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.__send_headers(status, _JSON_TYPE, len(body))
+        self.wfile.write(body)
+
+    def __send_error(self, status, message):
+        self.__send_json(status, {"error": message})
+
+    def __send_headers(self, status, content_type, length=None):
+        # HTTP/1.0: without a length, the end of the body is the end of the connection
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if length is not None:
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError("{} is not JSON serializable".format(type(value).__name__))
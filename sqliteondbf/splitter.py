@@ -14,97 +14,96 @@
    along with this program.  If not, see <http://www.gnu.org/licenses/>.
    """
 import io
+import re
 
 class Splitter():
     """A splitter: splits a script into separate chunks. By default, the
-    separator is the semicolon. Ignores separators in comments or strings"""
-    __NONE = 0
+    separator is the semicolon. Ignores separators in comments or strings.
+    Line comments are not recognized inside $instructions, to allow --options.
 
-    __OPEN_BLOCK_COMMENT_C1 = 10
-    __BLOCK_COMMENT_OPENED = 11
-    __BLOCK_COMMENT_OPENED_CLOSE_BLOCK_COMMENT_C1 = 12
+    The comments are removed from the chunks, except an unterminated comment
+    at the end of the script. The script is read by blocks of block_size
+    characters, and the scanner jumps from a significant token (comment start,
+    quote, separator) to the next one"""
+    __BLOCK_SIZE = 1 << 16
 
-    __OPEN_LINE_COMMENT_C1 = 20
-    __OPEN_LINE_COMMENT_C1 = 21
-    __LINE_COMMENT_OPENED = 22
-
-    __DOUBLE_QUOTED = 30
-    __DOUBLE_QUOTED_ESCAPE = 31
-
-    __SINGLE_QUOTED = 40
-    __SINGLE_QUOTED_ESCAPE = 41
-
-    def __init__(self, block_comment=("/*", "*/"), line_comment="--", splitter=";"):
+    def __init__(self, block_comment=("/*", "*/"), line_comment="--", splitter=";", block_size=__BLOCK_SIZE):
         self.__block_comment = block_comment
         self.__line_comment = line_comment
         self.__splitter = splitter
+        self.__block_size = block_size
+        self.__skip_re = self.__compile_skip_re([block_comment[0], line_comment, splitter])
+
+    def __compile_skip_re(self, tokens):
+        """the regex that skips the plain text and the quoted strings, up to the
+        next token, an unterminated quote or a possible token cut by the end of
+        the text"""
+        special = set(token[0] for token in tokens) | set("\"'")
+        alternatives = ["[^{}]+".format("".join(re.escape(c) for c in sorted(special)))]
+        for q in "\"'":
+            alternatives.append(r'{0}[^{0}\\]*(?:\\.[^{0}\\]*)*{0}'.format(q))
+        for c in sorted(special - set("\"'")):
+            followers = [re.escape(token[1:]) for token in tokens if token[0] == c]
+            if "" not in followers:
+                alternatives.append(r"{}(?!{}|\Z)".format(re.escape(c), "|".join(followers)))
+        return re.compile("(?:{})*".format("|".join(alternatives)), re.DOTALL)
 
     def split(self, script):
+        """yield the chunks of a script (a string or a file object)"""
         if type(script) == str:
             script = io.StringIO(script)
 
-        cur_chunk = []
-        state = Splitter.__NONE
+        parts = [] # the text of the current chunk before start
+        text, start, pos, eof = "", 0, 0, False
         while True:
-            c = script.read(1)
-            if not c:
-                break
+            pos = self.__skip_re.match(text, pos).end()
+            if text.startswith(self.__splitter, pos):
+                parts.append(text[start:pos])
+                chunk = "".join(parts).strip()
+                if chunk:
+                    yield chunk
+                parts = []
+                start = pos = pos + len(self.__splitter)
+                continue
 
-            if state == Splitter.__NONE:
-                if c == self.__block_comment[0][0]:
-                    state = Splitter.__OPEN_BLOCK_COMMENT_C1
-                elif c == self.__line_comment[0]:
-                    state = Splitter.__OPEN_LINE_COMMENT_C1
-                elif c == "\"":
-                    state = Splitter.__DOUBLE_QUOTED
-                elif c == "'":
-                    state = Splitter.__SINGLE_QUOTED
-                elif c == self.__splitter:
-                    chunk = "".join(cur_chunk).strip()
-                    if chunk:
-                        yield chunk
-                    cur_chunk = []
-                    continue
-            elif state == Splitter.__OPEN_BLOCK_COMMENT_C1:
-                if c == self.__block_comment[0][1]:
-                    state = Splitter.__BLOCK_COMMENT_OPENED
-                else:
-                    state = Splitter.__NONE
-            elif state == Splitter.__BLOCK_COMMENT_OPENED:
-                if c == self.__block_comment[1][0]:
-                    state = Splitter.__BLOCK_COMMENT_OPENED_CLOSE_BLOCK_COMMENT_C1
-            elif state == Splitter.__BLOCK_COMMENT_OPENED_CLOSE_BLOCK_COMMENT_C1:
-                if c == self.__block_comment[1][1]:
-                    cur_chunk = []
-                    state = Splitter.__NONE
+            if text.startswith(self.__block_comment[0], pos):
+                end = text.find(self.__block_comment[1], pos + len(self.__block_comment[0]))
+                if end >= 0:
+                    end += len(self.__block_comment[1])
+            elif text.startswith(self.__line_comment, pos):
+                if self.__is_instruction(parts, text[start:pos]):
+                    pos += len(self.__line_comment)
                     continue
-            elif state == Splitter.__OPEN_LINE_COMMENT_C1:
-                if c == self.__line_comment[1]:
-                    state = Splitter.__LINE_COMMENT_OPENED
-                else:
-                    state = Splitter.__NONE
-            elif state == Splitter.__LINE_COMMENT_OPENED:
-                if c == "\n":
-                    cur_chunk = []
-                    state = Splitter.__NONE
-                    continue
-            elif state == Splitter.__DOUBLE_QUOTED:
-                if c == "\\":
-                    state = Splitter.__DOUBLE_QUOTED_ESCAPE
-                if c == "\"":
-                    state = Splitter.__NONE
-            elif state == Splitter.__DOUBLE_QUOTED_ESCAPE:
-                state = Splitter.__DOUBLE_QUOTED;
-            elif state == Splitter.__SINGLE_QUOTED:
-                if c == "\\":
-                    state = Splitter.__SINGLE_QUOTED_ESCAPE
-                if c == "'":
-                    state = Splitter.__NONE
-            elif state == Splitter.__SINGLE_QUOTED_ESCAPE:
-                state = Splitter.__SINGLE_QUOTED;
+                end = text.find("\n", pos + len(self.__line_comment)) # the new line is kept
+            else:
+                end = -1 # end of text, unterminated quote or a token cut by the end of the text
 
-            cur_chunk.append(c)
+            if end >= 0:
+                parts.append(text[start:pos])
+                parts.append(" ")
+                start = pos = end
+            elif not eof:
+                text, eof = self.__read(script, text, start, pos, parts)
+                start = pos = 0
+            elif pos < len(text) and text[pos] not in "\"'" and not self.__is_comment_start(text, pos):
+                pos += 1 # a plain character
+            else:
+                break # the end, or an unterminated string or comment: keep the text
 
-        chunk = "".join(cur_chunk).strip()
+        chunk = "".join(parts + [text[start:]]).strip()
         if chunk:
             yield chunk
+
+    def __is_comment_start(self, text, pos):
+        return text.startswith(self.__block_comment[0], pos) or text.startswith(self.__line_comment, pos)
+
+    def __read(self, script, text, start, keep, parts):
+        """save the chunk text before keep, return the text from keep followed
+        by the next block and a flag for the end of the script"""
+        parts.append(text[start:keep])
+        # a long string or comment doubles the block: the rescans stay linear
+        block = script.read(max(self.__block_size, len(text) - keep))
+        return text[keep:] + block, not block
+
+    def __is_instruction(self, parts, text):
+        return "".join(parts + [text]).lstrip().startswith("$")
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import functools
+import hashlib
+import importlib.util
+import inspect
+import logging
+import marshal
+import os
+import math
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# `def [--options] name(` or `aggregate [--options] Name(`
+_HEADER_RE = re.compile(r"^(def|aggregate)((?:\s+--[\w-]+(?:=\S+|\s+\d+)?)*)\s+(\w+)\s*\(")
+_OPTION_RE = re.compile(r"--([\w-]+)(?:=(\S+)|\s+(\d+))?")
+
+# the code objects by hash of the source, for every executor of the process
+_CODE_BY_KEY = {}
+
+# the file name of the code objects, e.g. in the tracebacks and the profiles
+SCRIPT_FILENAME = "<sqliteondbf script>"
+DEFAULT_MEMOIZE_SIZE = 1024
+DEFAULT_BATCH_SIZE = 1 << 16
+
+
+def parse_definition(e):
+    """Parse a `def` or `aggregate` instruction. Return the name, the python
+    source (without the options) and the options: --deterministic and
+    --memoize [size] for a function"""
+    m = _HEADER_RE.match(e)
+    if not m:
+        raise Exception("bad definition: {}".format(e.splitlines()[0]))
+    kind, option_text, name = m.groups()
+    options = {}
+    for option in _OPTION_RE.finditer(option_text):
+        options[option.group(1).replace("-", "_")] = option.group(2) or option.group(3) or True
+    source = ("def " if kind == "def" else "class ") + e[m.end(2):].lstrip()
+    return name, source, options
+
+
+def compile_source(source, cache_dir=None, logger=logging.getLogger("sqliteondbf")):
+    """Return the code object of a source. The code objects are cached by hash
+    of the source in the process and, if cache_dir is not None, in this
+    directory (for the next runs)"""
+    key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    code = _CODE_BY_KEY.get(key)
+    if code is not None:
+        return code
+
+    if cache_dir is not None:
+        # the marshal format depends on the python version
+        path = os.path.join(cache_dir, "{}-{}.code".format(key, importlib.util.MAGIC_NUMBER.hex()))
+        try:
+            with open(path, 'rb') as f:
+                code = marshal.load(f)
+            logger.debug("load the code from {}".format(path))
+        except (OSError, EOFError, ValueError, TypeError):
+            code = compile(source, SCRIPT_FILENAME, "exec")
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(code, f)
+            os.replace(tmp_path, path)
+    else:
+        code = compile(source, SCRIPT_FILENAME, "exec")
+    _CODE_BY_KEY[key] = code
+    return code
+
+
+def define_function(connection, e, namespace=None, cache_dir=None, logger=logging.getLogger("sqliteondbf")):
+    """Create a SQLite function from a `def [--deterministic] [--memoize
+    [size]] name(args): ...` instruction. A memoized function keeps the last
+    results in a LRU cache and is deterministic. A deterministic function may
+    be factored out of the rows by SQLite. Return the name"""
+    name, source, options = parse_definition(e)
+    func = _execute(source, name, namespace, cache_dir, logger)
+    arg_count = _arg_count(func)
+    memoize = options.get("memoize")
+    if memoize:
+        size = DEFAULT_MEMOIZE_SIZE if memoize is True else int(memoize)
+        func = functools.lru_cache(maxsize=size)(func)
+    deterministic = bool(memoize or options.get("deterministic"))
+    logger.debug("create function {}/{} (deterministic: {}, memoize: {})".format(name, arg_count, deterministic, memoize))
+    if deterministic:
+        connection.create_function(name, arg_count, func, deterministic=True)
+    else:
+        connection.create_function(name, arg_count, func)
+    return name
+
+
+def define_aggregate(connection, e, namespace=None, cache_dir=None, logger=logging.getLogger("sqliteondbf")):
+    """Create a SQLite aggregate from an `aggregate [--batch-size size]
+    Name(): ...` instruction: a class with the methods step(self, args) and
+    finalize(self), or step_batch(self, arrays) and finalize(self) (see
+    batch_aggregate). Return the name"""
+    name, source, options = parse_definition(e)
+    clazz = _execute(source, name, namespace, cache_dir, logger)
+    if hasattr(clazz, "step_batch") and not hasattr(clazz, "step"):
+        clazz = batch_aggregate(clazz, int(options.get("batch_size", DEFAULT_BATCH_SIZE)))
+        arg_count = clazz.arg_count
+    else:
+        arg_count = _arg_count(clazz.step, 1)
+    logger.debug("create aggregate {}/{}".format(name, arg_count))
+    connection.create_aggregate(name, arg_count, clazz)
+    return name
+
+
+def _arg_count(func, skipped=0):
+    """The number of arguments of a SQLite function: -1 (any) for *args. skipped
+    is the count of the first arguments that are not SQL arguments (self)"""
+    code = func.__code__
+    if code.co_flags & inspect.CO_VARARGS:
+        return -1
+    return code.co_argcount - skipped
+
+
+def _execute(source, name, namespace, cache_dir, logger):
+    if namespace is None:
+        namespace = {}
+    exec(compile_source(source, cache_dir, logger), namespace)
+    return namespace[name]
+
+
+def batch_aggregate(clazz, batch_size=DEFAULT_BATCH_SIZE):
+    """Return a SQLite aggregate class from a class with the methods
+    step_batch(self, arrays) and finalize(self). The values are buffered and
+    step_batch is called with one numpy array per argument every batch_size
+    rows (and once more before finalize). As for the SQL aggregates, the rows
+    where the first argument is NULL are skipped. If step_batch takes *arrays,
+    the aggregate takes any number of arguments. Needs numpy.
+
+    SQLite still calls the python step of the aggregate for every row: the
+    values are appended to python lists, and only step_batch is vectorized.
+    The gain depends on the per-row work that numpy replaces"""
+    if numpy is None:
+        raise Exception("the batch aggregates need numpy")
+    arg_count = _arg_count(clazz.step_batch, 1)
+
+    class BatchAggregate(clazz):
+        def __init__(self):
+            super().__init__()
+            self.__buffers = None if arg_count == -1 else [[] for _ in range(arg_count)]
+
+        if arg_count == 1:
+            def step(self, value):
+                if value is not None:
+                    buffer = self.__buffers[0]
+                    buffer.append(value)
+                    if len(buffer) >= batch_size:
+                        self.__flush()
+        else:
+            def step(self, *values):
+                if self.__buffers is None:
+                    self.__buffers = [[] for _ in values]
+                if values and values[0] is not None:
+                    for buffer, value in zip(self.__buffers, values):
+                        buffer.append(value)
+                    if len(self.__buffers[0]) >= batch_size:
+                        self.__flush()
+
+        def finalize(self):
+            self.__flush()
+            return super().finalize()
+
+        def __flush(self):
+            if self.__buffers and self.__buffers[0]:
+                self.step_batch(*[numpy.asarray(buffer) for buffer in self.__buffers])
+                self.__buffers = [[] for _ in self.__buffers]
+
+    BatchAggregate.__name__ = clazz.__name__
+    BatchAggregate.arg_count = arg_count
+    return BatchAggregate
+
+
+def register_batch_aggregates(connection, batch_size=DEFAULT_BATCH_SIZE):
+    """Create the aggregates median(v), percentile(v, p) (p in [0, 100]),
+    variance(v) and stddev(v) (of a sample). Needs numpy"""
+    for name, clazz in BATCH_AGGREGATE_BY_NAME.items():
+        aggregate = batch_aggregate(clazz, batch_size)
+        connection.create_aggregate(name, aggregate.arg_count, aggregate)
+
+
+class Median():
+    def __init__(self):
+        self.arrays = []
+
+    def step_batch(self, values):
+        self.arrays.append(values)
+
+    def finalize(self):
+        if not self.arrays:
+            return None
+        return float(numpy.median(numpy.concatenate(self.arrays)))
+
+
+class Percentile():
+    def __init__(self):
+        self.arrays = []
+        self.percent = None
+
+    def step_batch(self, values, percents):
+        self.arrays.append(values)
+        self.percent = float(percents[0])
+
+    def finalize(self):
+        if not self.arrays:
+            return None
+        return float(numpy.percentile(numpy.concatenate(self.arrays), self.percent))
+
+
+class Variance():
+    """The variance of a sample. The batches are merged with the count, mean
+    and sum of squares of differences of each batch (Chan et al.)"""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step_batch(self, values):
+        values = values.astype(float)
+        count = len(values)
+        mean = values.mean()
+        delta = mean - self.mean
+        total = self.count + count
+        self.m2 += ((values - mean) ** 2).sum() + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    def finalize(self):
+        if self.count < 2:
+            return None
+        return float(self.m2 / (self.count - 1))
+
+
+class StdDev(Variance):
+    def finalize(self):
+        variance = super().finalize()
+        return None if variance is None else math.sqrt(variance)
+
+
+BATCH_AGGREGATE_BY_NAME = {
+    "median": Median,
+    "percentile": Percentile,
+    "variance": Variance,
+    "stddev": StdDev,
+}
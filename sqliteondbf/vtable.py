@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import datetime
+import dbfread
+import logging
+import os
+
+try:
+    import apsw
+except ImportError:
+    apsw = None
+
+from sqliteondbf.converter import SQLiteConverter as _SQLiteConverter, SQLiteConverterWorker as _SQLiteConverterWorker
+from sqliteondbf.reader import DBFReader as _DBFReader
+
+
+def connect(dbf_path, logger=logging.getLogger("sqliteondbf"), lowernames=True, encoding="cp850", char_decode_errors="strict",
+            use_mmap=False):
+    """take a dBase (= set of dbf files) directory and return an apsw connection
+    where every dbf file is a virtual table. Nothing is imported: the records
+    are read from the files by every query. Needs apsw"""
+    if apsw is None:
+        raise Exception("the virtual tables need apsw")
+
+    connection = apsw.Connection(":memory:")
+    register(connection, lowernames=lowernames, encoding=encoding, char_decode_errors=char_decode_errors, use_mmap=use_mmap)
+    for fpath in _SQLiteConverter(connection, logger).dbf_files(dbf_path):
+        name = os.path.splitext(os.path.basename(fpath))[0].lower()
+        sql = "CREATE VIRTUAL TABLE \"{}\" USING dbf('{}')".format(name, fpath.replace("'", "''"))
+        logger.debug("create virtual table SQL:\n{}".format(sql))
+        try:
+            connection.execute(sql)
+        except (apsw.Error, ValueError, dbfread.DBFNotFound, dbfread.MissingMemoFile) as err:
+            logger.warning("skip dbf file {}: {}".format(fpath, err))
+    return connection
+
+
+def register(connection, name="dbf", **kwargs):
+    """register the dbf module on an apsw connection:
+    `CREATE VIRTUAL TABLE t USING dbf('path/to/file.dbf'[, 'encoding'])`"""
+    connection.createmodule(name, DBFModule(**kwargs))
+
+
+class DBFModule():
+    """An apsw virtual table module over a dbf file"""
+
+    def __init__(self, lowernames=True, encoding="cp850", char_decode_errors="strict", use_mmap=False):
+        self.__lowernames = lowernames
+        self.__encoding = encoding
+        self.__char_decode_errors = char_decode_errors
+        self.__use_mmap = use_mmap
+
+    def Create(self, connection, modulename, databasename, tablename, *args):
+        if not args:
+            raise ValueError("missing dbf file: USING {}('path/to/file.dbf')".format(modulename))
+        fpath = _unquote(args[0])
+        encoding = _unquote(args[1]) if len(args) > 1 else self.__encoding
+        dbf_table = dbfread.DBF(fpath, lowernames=self.__lowernames, encoding=encoding,
+                                char_decode_errors=self.__char_decode_errors)
+        if _DBFReader.supports(dbf_table):
+            reader = _DBFReader(dbf_table, use_mmap=self.__use_mmap)
+        else:
+            reader = _DBFReadRecords(dbf_table, use_mmap=self.__use_mmap)
+
+        fields = ['"{}" {}'.format(f.name, _SQLiteConverterWorker.column_type(f)) for f in dbf_table.fields]
+        schema = 'CREATE TABLE x ({})'.format(', '.join(fields))
+        return schema, DBFVirtualTable(reader)
+
+    Connect = Create
+
+
+class DBFVirtualTable():
+    """A virtual table: a full scan of the dbf file"""
+
+    def __init__(self, reader):
+        self.__reader = reader
+
+    def BestIndex(self, constraints, orderbys):
+        return None
+
+    def Open(self):
+        return DBFVirtualCursor(self.__reader)
+
+    def Disconnect(self):
+        pass
+
+    Destroy = Disconnect
+
+
+class DBFVirtualCursor():
+    """A cursor over the records. The fields are decoded only when SQLite reads
+    the column: the projection is pushed down to the reader"""
+
+    def __init__(self, reader):
+        self.__reader = reader
+        self.__parsers = reader.value_parsers()
+        self.__records = None
+        self.__current = None
+
+    def Filter(self, indexnum, indexname, constraintargs):
+        self.Close()
+        self.__records = self.__reader.raw_records()
+        self.Next()
+
+    def Eof(self):
+        return self.__current is None
+
+    def Rowid(self):
+        return self.__current[0]
+
+    def Column(self, number):
+        if number == -1:
+            return self.__current[0]
+        return _to_sqlite(self.__parsers[number](self.__current[1][number]))
+
+    def Next(self):
+        self.__current = next(self.__records, None)
+
+    def Close(self):
+        if self.__records is not None:
+            self.__records.close()
+
+
+class _DBFReadRecords():
+    """The records of a table with fields that a DBFReader doesn't support
+    (e.g. memo fields): the values are decoded by dbfread, the record numbers
+    are read by a DBFReader without columns"""
+
+    def __init__(self, dbf_table, use_mmap=False):
+        self.__dbf_table = dbf_table
+        self.__recno_reader = _DBFReader(dbf_table, use_mmap=use_mmap, columns=[])
+
+    def raw_records(self):
+        """yield (record number, decoded field values) for the active records"""
+        recnos = self.__recno_reader.raw_records()
+        records = iter(self.__dbf_table)
+        try:
+            for (recno, _), record in zip(recnos, records):
+                yield recno, tuple(record.values())
+        finally:
+            recnos.close()
+            records.close()
+
+    def value_parsers(self):
+        """the values are already decoded"""
+        return [_identity for _ in self.__dbf_table.fields]
+
+
+def _identity(value):
+    return value
+
+
+def _unquote(arg):
+    arg = arg.strip()
+    if len(arg) >= 2 and arg[0] == arg[-1] and arg[0] in "'\"":
+        return arg[1:-1].replace(arg[0]*2, arg[0])
+    return arg
+
+
+def _to_sqlite(value):
+    # apsw does not adapt the values like the sqlite3 module does
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
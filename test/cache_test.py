@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.cache as ca
+import sqliteondbf.executor as ex
+import unittest
+from unittest.mock import *
+import os
+import shutil
+import tempfile
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+class ConversionCacheTest(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual([None, 10, 500 * 1024 ** 2, 3 * 1024 ** 3 // 2], [ca.parse_size(s) for s in (None, 10, "500M", "1.5GB")])
+        self.assertRaises(ValueError, ca.parse_size, "big")
+
+    def test_connect(self):
+        query = 'SELECT * FROM "2016-stc-detailed" ORDER BY state_code, item_code'
+        with tempfile.TemporaryDirectory() as d:
+            dbf_path = os.path.join(d, "dbf")
+            shutil.copytree(EXAMPLES, dbf_path)
+            cache_dir = os.path.join(d, "cache")
+            expected = ex.connect(dbf_path, encoding="utf-8").execute(query).fetchall()
+
+            def connect(**kwargs):
+                logger = Mock()
+                connection = ex.connect(dbf_path, logger, encoding="utf-8", cache_dir=cache_dir, **kwargs)
+                self.assertEqual(expected, connection.execute(query).fetchall())
+                return [c[1][0].split(":")[0] for c in logger.mock_calls if "cache" in c[1][0]]
+
+            self.assertEqual(["store the converted database in the cache"], connect())
+            self.assertEqual(["load the converted database from the cache"], connect())
+            os.utime(os.path.join(dbf_path, "item.dbf"), (0, 0))
+            self.assertEqual(["store the converted database in the cache"], connect())
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+            self.assertEqual(["store the converted database in the cache"] + ["remove the converted database from the cache"] * 2,
+                             connect(indexes={"item": ["item_code"]}, cache_size=1))
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+            self.assertEqual(["the conversion options can't be cached"], connect(where={"item": lambda row: True}))
+
+class ResultCacheTest(unittest.TestCase):
+    def test_capture(self):
+        import sqlite3
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE t(v)")
+        connection.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+        connection.commit()
+        cache = ca.ResultCache(connection, batch_size=3)
+        self.assertIsNone(cache.cursor())
+
+        cursor = connection.cursor()
+        cache.start(cursor.execute("SELECT v, '0012' AS s FROM t"))
+        first = cache.cursor()
+        self.assertEqual([("v",), ("s",)], [description[:1] for description in first.description])
+        self.assertEqual([(0, '0012'), (1, '0012')], first.fetchmany(2))
+        replay = cache.cursor() # the rest of the rows are captured
+        self.assertEqual([(i, '0012') for i in range(10)], replay.fetchall())
+        self.assertFalse(connection.in_transaction)
+
+        pending = cache.cursor()
+        pending.fetchone()
+        cache.start(cursor.execute("SELECT v FROM t WHERE v > 7"))
+        self.assertEqual([(8,), (9,)], list(cache.cursor()))
+        self.assertEqual(2, len(connection.execute("SELECT name FROM sqlite_temp_master").fetchall())) # locked
+        cache.clear()
+        self.assertEqual([], connection.execute("SELECT name FROM sqlite_temp_master").fetchall())
+
+if __name__ == '__main__':
+    unittest.main()
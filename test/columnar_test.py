@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.columnar as co
+import sqliteondbf.executor as ex
+import unittest
+import os
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pass
+import tempfile
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "examples")
+QUERY = 'SELECT state_code, item_code, amount, amount * 2 AS twice FROM "2016-stc-detailed" ORDER BY state_code, item_code'
+
+class DeclaredTypesTest(unittest.TestCase):
+    def test_declared_types(self):
+        connection = ex.connect(EXAMPLES, encoding="utf-8")
+        self.assertEqual(["TEXT", "TEXT", "REAL", ""], co.declared_types(connection, QUERY))
+        self.assertIsNone(co.declared_types(connection, "DELETE FROM state"))
+
+    def test_export_format(self):
+        self.assertEqual(["csv", "parquet", "arrow"], [ex.export_format(p) for p in ("a.csv", "a.PARQUET", "a.arrow")])
+
+@unittest.skipIf(co.pyarrow is None, "pyarrow is not installed")
+class ColumnarExportTest(unittest.TestCase):
+    def test_export(self):
+        import pyarrow.ipc
+        import pyarrow.parquet
+        connection = ex.connect(EXAMPLES, encoding="utf-8")
+        expected = connection.execute(QUERY).fetchall()
+        with tempfile.TemporaryDirectory() as d:
+            parquet_path = os.path.join(d, "result.parquet")
+            arrow_path = os.path.join(d, "result.out")
+            ex.SQLiteExecutor("$connect dbf '{}' utf-8; {}; $export '{}'; $export '{}' --format arrow".format(
+                EXAMPLES, QUERY, parquet_path, arrow_path)).execute()
+
+            for table in (pyarrow.parquet.read_table(parquet_path), pyarrow.ipc.open_file(arrow_path).read_all()):
+                self.assertEqual(["string", "string", "double", "double"], [str(t) for t in table.schema.types])
+                self.assertEqual(expected, list(zip(*(c.to_pylist() for c in table.columns))))
+
+    def test_types(self):
+        import sqlite3
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE t(i INTEGER, j INT, v VARCHAR(10), n NUMERIC, b, d DATE)")
+        connection.executemany("INSERT INTO t VALUES (?, ?, ?, ?, ?, ?)",
+                               [(1, 1, "a", 1, None, "2018-01-02"), (5.5, 2, "b", 2.5, None, "2018-01-03"), (3, 3, 4, 3, 7, None)])
+        query = "SELECT * FROM t"
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "t.arrow")
+            # the first batch: 5.5 widens i, b is NULL (text)
+            co.write_columnar(connection.execute(query), path, "arrow", co.declared_types(connection, query), batch_size=2)
+            table = pyarrow.ipc.open_file(path).read_all()
+            self.assertEqual(["double", "int64", "string", "double", "string", "date32[day]"], [str(t) for t in table.schema.types])
+            self.assertEqual([1.0, 5.5, 3.0], table.column("i").to_pylist())
+            self.assertEqual(["a", "b", "4"], table.column("v").to_pylist())
+            self.assertEqual([None, None, "7"], table.column("b").to_pylist())
+
+            connection.execute("INSERT INTO t VALUES (4, 4.5, 'c', 4, 'x', NULL)")
+            self.assertRaises(Exception, co.write_columnar, connection.execute(query), path, "arrow",
+                              co.declared_types(connection, query), batch_size=2)
+
+if __name__ == '__main__':
+    unittest.main()
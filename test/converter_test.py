@@ -219,3 +219,244 @@ class ConverterTest(unittest.TestCase):
         self.__verify_calls([
             call.warning('no dbf file in dir'),
         ], self.__logger)
+
+class ParallelConverterTest(unittest.TestCase):
+    def test_parallel_same_as_sequential(self):
+        import os
+        import sqlite3
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+        def dump(workers, **kwargs):
+            connection = sqlite3.connect(":memory:")
+            cv.SQLiteConverter(connection, Mock()).import_dbf(dbf_path, encoding="utf-8", workers=workers, **kwargs)
+            return list(connection.iterdump())
+
+        self.assertEqual(dump(1), dump(2))
+        # the rows of a table are decoded by chunks, and inserted in order
+        with patch.object(cv, "_PARALLEL_CHUNK_SIZE", 100):
+            for kwargs in ({}, {"narrow_types": True, "columns": {"2016-stc-detailed": ["state_code", "amount"]}}):
+                self.assertEqual(dump(1, **kwargs), dump(3, **kwargs))
+
+    def test_parallel_memo(self):
+        import os
+        import sqlite3
+        import tempfile
+        from reader_test import write_dbf
+        fields = [("c", "C", 5, 0), ("n", "N", 4, 0), ("m", "M", 10, 0)]
+        with tempfile.TemporaryDirectory() as d:
+            write_dbf(os.path.join(d, "t.dbf"), fields[:2], [(False, [b"a", b"1"]), (True, [b"b", b"2"]),
+                                                              (False, [b"c", b"3"])])
+            write_dbf(os.path.join(d, "m.dbf"), fields, [(False, [b"a", b"1", b""])]) # read by dbfread
+            open(os.path.join(d, "m.dbt"), "wb").close()
+            with patch.object(cv, "_PARALLEL_CHUNK_SIZE", 1):
+                connection = sqlite3.connect(":memory:")
+                cv.SQLiteConverter(connection, Mock()).import_dbf(d, workers=2)
+            self.assertEqual([("a", 1), ("c", 3)], connection.execute("SELECT * FROM t").fetchall())
+            self.assertEqual([("a", 1, None)], connection.execute("SELECT * FROM m").fetchall())
+
+class IncrementalConverterTest(unittest.TestCase):
+    def test_incremental(self):
+        import os
+        import shutil
+        import sqlite3
+        import tempfile
+        examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+        with tempfile.TemporaryDirectory() as d:
+            dbf_path = os.path.join(d, "dbf")
+            os.mkdir(dbf_path)
+            for name in ("item.dbf", "state.dbf"):
+                shutil.copy(os.path.join(examples, name), dbf_path)
+            sqlite_path = os.path.join(d, "base.db")
+
+            def convert(workers=1, **kwargs):
+                logger = Mock()
+                connection = sqlite3.connect(sqlite_path)
+                cv.SQLiteConverter(connection, logger).import_dbf(dbf_path, encoding="utf-8", incremental=True,
+                                                                  workers=workers, **kwargs)
+                connection.close()
+                return [c for c in logger.mock_calls if c[0] == "info" and c[1][0].startswith("import dbf file")]
+
+            self.assertEqual(2, len(convert()))
+            self.assertEqual(0, len(convert()))
+            os.utime(os.path.join(dbf_path, "item.dbf"), (0, 0))
+            self.assertEqual([call.info("import dbf file #1: {}".format(os.path.join(dbf_path, "item.dbf")))], convert())
+
+            # other options: the tables are imported again
+            for workers in (1, 2):
+                self.assertEqual(1, len(convert(workers, columns={"item": ["item_code"]})))
+                self.assertEqual(0, len(convert(workers, columns={"item": ["item_code"]})))
+                self.assertEqual(1, len(convert(workers)))
+            self.assertEqual(2, len(convert(narrow_types=True)))
+            connection = sqlite3.connect(sqlite_path)
+            self.assertEqual(["item_code", "item_name"], [r[1] for r in connection.execute("PRAGMA table_info(item)")])
+            connection.close()
+            where = {"item": lambda row: True}
+            self.assertEqual(1, len(convert(where=where, narrow_types=True)))
+            self.assertEqual(1, len(convert(where=where, narrow_types=True)))
+
+class DeltaConverterTest(unittest.TestCase):
+    def test_delta(self):
+        import os
+        import sqlite3
+        import tempfile
+        from reader_test import write_dbf
+        fields = [("c", "C", 5, 0), ("n", "N", 4, 0)]
+        with tempfile.TemporaryDirectory() as d:
+            dbf_path = os.path.join(d, "dbf")
+            os.mkdir(dbf_path)
+            fpath = os.path.join(dbf_path, "log.dbf")
+            sqlite_path = os.path.join(d, "base.db")
+
+            def convert(**kwargs):
+                logger = Mock()
+                connection = sqlite3.connect(sqlite_path)
+                cv.SQLiteConverter(connection, logger).import_dbf(dbf_path, delta=True, **kwargs)
+                rows = connection.execute('SELECT * FROM log ORDER BY _recno').fetchall()
+                connection.close()
+                return rows, logger
+
+            write_dbf(fpath, fields, [(False, [b"a", b"1"]), (True, [b"b", b"2"]), (False, [b"c", b"3"])])
+            rows, _ = convert()
+            self.assertEqual([(0, "a", 1), (2, "c", 3)], rows)
+
+            write_dbf(fpath, fields, [(True, [b"a", b"1"]), (True, [b"b", b"2"]), (False, [b"c", b"3"]),
+                                      (False, [b"d", b"4"])])
+            os.utime(fpath, (0, 0))
+            rows, logger = convert()
+            self.assertEqual([(2, "c", 3), (3, "d", 4)], rows)
+            self.assertTrue(call.info("append records 3..4 of {}".format(fpath)) in logger.mock_calls)
+
+            # a recalled record is imported again
+            write_dbf(fpath, fields, [(False, [b"a", b"1"]), (True, [b"b", b"2"]), (False, [b"c", b"3"]),
+                                      (False, [b"d", b"4"]), (False, [b"e", b"5"])])
+            os.utime(fpath, (1, 1))
+            rows, logger = convert()
+            self.assertEqual([(0, "a", 1), (2, "c", 3), (3, "d", 4), (4, "e", 5)], rows)
+            self.assertTrue(call.info("import 1 recalled record(s) of {}".format(fpath)) in logger.mock_calls)
+
+            # other options: the whole file is imported
+            os.utime(fpath, (2, 2))
+            rows, logger = convert(columns={"log": ["n"]}, where={"log": "n > 1"})
+            self.assertEqual([(2, 3), (3, 4), (4, 5)], rows)
+            self.assertTrue(call.info("the import options of {} changed: import the whole file".format(fpath))
+                            in logger.mock_calls)
+
+            # the file didn't change, but the options did
+            rows, logger = convert()
+            self.assertEqual([(0, "a", 1), (2, "c", 3), (3, "d", 4), (4, "e", 5)], rows)
+            self.assertTrue(call.info("the import options of {} changed".format(fpath)) in logger.mock_calls)
+            rows, logger = convert()
+            self.assertTrue(call.info("skip unchanged dbf file: {}".format(fpath)) in logger.mock_calls)
+            if sqlite3.sqlite_version_info >= cv.STRICT_VERSION:
+                convert(strict=True)
+                connection = sqlite3.connect(sqlite_path)
+                self.assertIn("STRICT", connection.execute("SELECT sql FROM sqlite_master WHERE name = 'log'").fetchone()[0])
+                connection.close()
+
+class ProjectionConverterTest(unittest.TestCase):
+    def test_columns_and_where(self):
+        import os
+        import sqlite3
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        columns = {"2016-stc-detailed": ["state_code", "amount"], "item": ["item_code"]}
+
+        for workers in (1, 2):
+            for where in ({"2016-stc-detailed": "amount > 1000000 AND state_code <> '0'"},
+                          {"2016-stc-detailed": lambda row: row["amount"] is not None and row["amount"] > 1000000 and row["state_code"] != "0"}):
+                connection = sqlite3.connect(":memory:")
+                cv.SQLiteConverter(connection, Mock()).import_dbf(dbf_path, encoding="utf-8", workers=workers, columns=columns,
+                                                                  where=where)
+                self.assertEqual(["state_code", "amount"],
+                                 [r[1] for r in connection.execute('PRAGMA table_info("2016-stc-detailed")')])
+                self.assertEqual(["item_code"], [r[1] for r in connection.execute('PRAGMA table_info(item)')])
+                self.assertEqual(2, len(list(connection.execute('PRAGMA table_info(state)'))))
+                self.assertEqual((0,), connection.execute(
+                    'SELECT COUNT(*) FROM "2016-stc-detailed" WHERE amount <= 1000000 OR state_code = \'0\'').fetchone())
+                self.assertTrue(connection.execute('SELECT COUNT(*) FROM "2016-stc-detailed"').fetchone()[0] > 0)
+
+    def test_unknown_columns(self):
+        import os
+        import sqlite3
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        for workers in (1, 2):
+            with self.assertRaisesRegex(Exception, r"unknown column\(s\) \['nope'\] of table item"):
+                cv.SQLiteConverter(sqlite3.connect(":memory:"), Mock()).import_dbf(
+                    dbf_path, encoding="utf-8", workers=workers, columns={"item": ["item_code", "nope"]})
+
+class BatchConverterTest(unittest.TestCase):
+    def test_batches(self):
+        import os
+        import sqlite3
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+        def dump(**kwargs):
+            connection = sqlite3.connect(":memory:")
+            cv.SQLiteConverter(connection, Mock()).import_dbf(dbf_path, encoding="utf-8", **kwargs)
+            return sorted(connection.iterdump())
+
+        events = []
+        self.assertEqual(dump(), dump(batch_size=100, batch_commit=True, progress=events.append))
+        detailed_events = [e for e in events if e.table_name == "2016-stc-detailed"]
+        self.assertEqual([100, 200, 300], [e.rows for e in detailed_events[:3]])
+        self.assertEqual([False] * 17 + [True], [e.done for e in detailed_events])
+        self.assertEqual((1612, 1612), (detailed_events[-1].numrecords, detailed_events[-1].rows))
+        self.assertEqual(3, len([e for e in events if e.done]))
+
+        # the rows are counted after the filter
+        for where in ("amount > 1000000", lambda row: row["amount"] is not None and row["amount"] > 1000000):
+            events = []
+            connection = sqlite3.connect(":memory:")
+            cv.SQLiteConverter(connection, Mock()).import_dbf(dbf_path, encoding="utf-8", batch_size=1000, progress=events.append,
+                                                              where={"2016-stc-detailed": where})
+            count = connection.execute('SELECT COUNT(*) FROM "2016-stc-detailed"').fetchone()[0]
+            last = [e for e in events if e.table_name == "2016-stc-detailed"][-1]
+            self.assertTrue(0 < count < 1612)
+            self.assertEqual((1612, count), (last.records, last.rows))
+
+    def test_batches_logged(self):
+        import os
+        import sqlite3
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        logger = Mock()
+        cv.SQLiteConverter(sqlite3.connect(":memory:"), logger).import_dbf(dbf_path, encoding="utf-8", batch_size=1000,
+                                                                         workers=2)
+        messages = [c[1][0] for c in logger.mock_calls if c[0] == "info" and c[1][0].startswith("import progress")]
+        self.assertTrue(any(m.endswith("(done)") for m in messages))
+
+class NarrowTypesConverterTest(unittest.TestCase):
+    def test_narrow_types(self):
+        import os
+        import sqlite3
+        import tempfile
+        from reader_test import write_dbf
+        fields = [("code", "C", 5, 0), ("qty", "N", 6, 0), ("price", "N", 8, 2), ("total", "N", 8, 2), ("ok", "L", 1, 0),
+                  ("memo", "M", 10, 0)]
+        records = [(False, [b"  A1", b"12", b"3.00", b"4.50", b"T", b""]), (False, [b"B2 ", b"", b"5", b"6.25", b"F", b""])]
+        with tempfile.TemporaryDirectory() as d:
+            write_dbf(os.path.join(d, "t.dbf"), fields[:5], records)
+            write_dbf(os.path.join(d, "m.dbf"), fields, records) # read by dbfread
+            open(os.path.join(d, "m.dbt"), "wb").close()
+
+            def convert(**kwargs):
+                connection = sqlite3.connect(":memory:")
+                cv.SQLiteConverter(connection, Mock()).import_dbf(d, **kwargs)
+                types = [(r[1], r[2]) for r in connection.execute('PRAGMA table_info("t")')]
+                sql = connection.execute("SELECT sql FROM sqlite_master WHERE name = 't'").fetchone()[0]
+                rows = [connection.execute('SELECT code, qty, price, total FROM "{}"'.format(name)).fetchall()
+                        for name in ("t", "m")]
+                return types, sql, rows
+
+            types, sql, rows = convert(narrow_types=True, sample_size=10)
+            self.assertEqual([("code", "TEXT"), ("qty", "INTEGER"), ("price", "INTEGER"), ("total", "REAL"), ("ok", "BOOLEAN")],
+                             types)
+            self.assertEqual([[("A1", 12, 3, 4.5), ("B2", None, 5, 6.25)]] * 2, rows)
+
+            types, _, rows = convert(narrow_types=True, workers=2)
+            self.assertEqual(["TEXT", "INTEGER", "REAL", "REAL", "BOOLEAN"], [t for _, t in types])
+            self.assertEqual([[("A1", 12, 3.0, 4.5), ("B2", None, 5.0, 6.25)]] * 2, rows)
+
+            if sqlite3.sqlite_version_info >= cv.STRICT_VERSION:
+                types, sql, rows = convert(narrow_types=True, sample_size=10, strict=True)
+                self.assertEqual(["TEXT", "INTEGER", "REAL", "REAL", "INTEGER"], [t for _, t in types])
+                self.assertTrue(sql.endswith("STRICT"))
+                self.assertEqual([[("A1", 12, 3.0, 4.5), ("B2", None, 5.0, 6.25)]] * 2, rows)
@@ -49,5 +49,244 @@ class ExecutorTest(unittest.TestCase):
         executor = ex.SQLiteExecutor("SQL")
         self.assertRaises(Exception, executor.execute)
 
+    def testConnectJobs(self):
+        import os
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        executor = ex.SQLiteExecutor("$connect dbf '{}' utf-8 --jobs 2 --mmap; SELECT * FROM item".format(dbf_path))
+        executor.execute()
+
+        def contents(connection):
+            table_names = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+            return {table_name: (connection.execute('PRAGMA table_info("{}")'.format(table_name)).fetchall(),
+                                 sorted(connection.execute('SELECT * FROM "{}"'.format(table_name)), key=repr))
+                    for table_name in table_names}
+
+        expected = contents(ex.connect(dbf_path, encoding="utf-8"))
+        self.assertTrue(expected)
+        for workers in (2, 8):
+            self.assertEqual(expected, contents(ex.connect(dbf_path, encoding="utf-8", workers=workers, use_mmap=True)))
+
+    def testConvertFastLoad(self):
+        import os
+        import tempfile
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        with tempfile.TemporaryDirectory() as d:
+            for fast_load, journal_mode in ((True, "delete"), ({"journal_mode": "WAL"}, "wal")):
+                sqlite_path = os.path.join(d, "{}.db".format(journal_mode))
+                connection = ex.convert(dbf_path, sqlite_path, encoding="utf-8", fast_load=fast_load)
+                self.assertEqual(journal_mode, connection.execute("PRAGMA journal_mode").fetchone()[0])
+                self.assertEqual(2, connection.execute("PRAGMA synchronous").fetchone()[0])
+                self.assertEqual(16384, connection.execute("PRAGMA page_size").fetchone()[0])
+                self.assertEqual(3, len(connection.execute("SELECT * FROM state LIMIT 3").fetchall()))
+                connection.close()
+
+    def testIndex(self):
+        import csv
+        import os
+        import tempfile
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        connection = ex.connect(dbf_path, encoding="utf-8", indexes={"item": ["item_code"], "state": [["state_code", "state_name"]]})
+        self.assertEqual(["item_item_code_idx", "state_state_code_state_name_idx"],
+                         [r[0] for r in connection.execute("SELECT name FROM sqlite_master WHERE type='index' ORDER BY name")])
+
+        with tempfile.TemporaryDirectory() as d:
+            csv_path = os.path.join(d, "indexes.csv")
+            executor = ex.SQLiteExecutor('$connect dbf "{}" utf-8; $index "2016-stc-detailed"(item_code, state_code); '
+                                         "SELECT name, tbl_name FROM sqlite_master WHERE type='index' ORDER BY name; "
+                                         "$export '{}'".format(dbf_path, csv_path))
+            executor.execute()
+            with open(csv_path, newline='', encoding='utf-8') as f:
+                self.assertEqual([["2016-stc-detailed_item_code_state_code_idx", "2016-stc-detailed"]], list(csv.reader(f))[1:])
+
+        executor = ex.SQLiteExecutor('$connect dbf "{}" utf-8; $index item(item_code) --name item_idx'.format(dbf_path))
+        with self.assertRaisesRegex(Exception, r"\$index takes no option \(--name\)"):
+            executor.execute()
+
+    def testConnectColumns(self):
+        import csv
+        import os
+        import tempfile
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        expected_count = ex.connect(dbf_path, encoding="utf-8").execute("SELECT COUNT(*) FROM state WHERE state_code <> '0'").fetchone()[0]
+        with tempfile.TemporaryDirectory() as d:
+            executor = ex.SQLiteExecutor("""$connect dbf '{0}' utf-8 --columns item:item_code --columns "state:state_code, state_name"
+                --where "state:state_code <> '0'";
+                SELECT item_code FROM item; SELECT state_name FROM state WHERE state_code = '0'; $view;
+                SELECT name FROM pragma_table_info('item'); $export '{1}/item.csv';
+                SELECT name FROM pragma_table_info('state'); $export '{1}/state.csv';
+                SELECT COUNT(*), SUM(state_code = '0') FROM state; $export '{1}/count.csv'""".format(dbf_path, d))
+            executor.execute()
+
+            def rows(name):
+                with open(os.path.join(d, name), newline='', encoding='utf-8') as f:
+                    return list(csv.reader(f))[1:]
+
+            self.assertEqual([["item_code"]], rows("item.csv"))
+            self.assertEqual([["state_code"], ["state_name"]], rows("state.csv"))
+            self.assertEqual([[str(expected_count), "0"]], rows("count.csv"))
+
+    def testConnectBatchSize(self):
+        import csv
+        import os
+        import tempfile
+        from unittest.mock import Mock
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        with tempfile.TemporaryDirectory() as d:
+            csv_path = os.path.join(d, "count.csv")
+            logger = Mock()
+            executor = ex.SQLiteExecutor("""$connect dbf '{}' utf-8 --batch-size 500 --batch-commit;
+                SELECT COUNT(*) FROM "2016-stc-detailed"; $export '{}'""".format(dbf_path, csv_path), logger)
+            executor.execute()
+            with open(csv_path, newline='', encoding='utf-8') as f:
+                self.assertEqual(["1612"], list(csv.reader(f))[1])
+
+        messages = [c[1][0] for c in logger.mock_calls if c[0] == "info" and c[1][0].startswith("import progress 2016-stc-detailed")]
+        self.assertEqual(["500/1612", "1000/1612", "1500/1612", "1612/1612", "1612/1612"], [m.split()[3] for m in messages])
+        self.assertTrue(messages[-1].endswith("(done)"))
+
+    def testExportCompression(self):
+        import gzip
+        import os
+        import tempfile
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        with tempfile.TemporaryDirectory() as d:
+            csv_path = os.path.join(d, "state.csv.gz")
+            executor = ex.SQLiteExecutor("$connect dbf '{}' utf-8; SELECT * FROM state ORDER BY state_code LIMIT 2; "
+                                         "$export '{}' --dialect excel-tab".format(dbf_path, csv_path))
+            executor.execute()
+            with gzip.open(csv_path, 'rt', encoding='utf-8') as f:
+                self.assertEqual(["state_code\tstate_name", "0\tUnited States"], f.read().splitlines()[:2])
+
+    def testExportPartitions(self):
+        import csv
+        import glob
+        import os
+        import sqlite3
+        import tempfile
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        query = 'SELECT rowid, * FROM "2016-stc-detailed"'
+        with tempfile.TemporaryDirectory() as d:
+            connection = ex.convert(dbf_path, os.path.join(d, "base.db"), encoding="utf-8")
+            expected = sorted(tuple(str(v) for v in row) for row in connection.execute(query))
+            for by, source in (("rowid", "sqlite '{}'".format(os.path.join(d, "base.db"))), ("state_code", "dbf '{}' utf-8".format(dbf_path))):
+                pattern = os.path.join(d, by, "part_*.csv")
+                os.mkdir(os.path.dirname(pattern))
+                executor = ex.SQLiteExecutor("$connect {}; {}; $export '{}' --partitions 3 --by {}".format(source, query, pattern, by))
+                executor.execute()
+
+                rows = []
+                paths = sorted(glob.glob(pattern))
+                self.assertEqual(3, len(paths))
+                for path in paths:
+                    with open(path, newline='', encoding='utf-8') as f:
+                        part = list(csv.reader(f))[1:]
+                        self.assertTrue(part)
+                        rows += [tuple(row) for row in part]
+                self.assertEqual(expected, sorted(rows))
+
+            connection = sqlite3.connect(":memory:")
+            connection.execute("CREATE TABLE t(v)")
+            connection.executemany("INSERT INTO t VALUES (?)", [(1,), (2,)])
+            pattern = os.path.join(d, "t_*.csv")
+            for query, message in (("SELECT * FROM t", "not in the result"), ("SELECT NULL AS rowid, * FROM t", "NULL in every row")):
+                with self.assertRaisesRegex(Exception, message):
+                    ex.export_partitions(connection, query, pattern, 2)
+            self.assertEqual([], glob.glob(pattern))
+
+    def testDumpFormats(self):
+        import gzip
+        import os
+        import sqlite3
+        import tempfile
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        with tempfile.TemporaryDirectory() as d:
+            sql_path, gz_path, db_path = [os.path.join(d, name) for name in ("base.sql", "base.sql.gz", "base.db")]
+            executor = ex.SQLiteExecutor("$connect dbf '{}' utf-8 --lazy; $dump '{}'; $dump '{}'; $dump '{}' --format binary".format(
+                dbf_path, sql_path, gz_path, db_path))
+            executor.execute()
+
+            with open(sql_path, encoding="utf-8") as f, gzip.open(gz_path, "rt", encoding="utf-8") as g:
+                self.assertEqual(f.read(), g.read())
+            connection = sqlite3.connect(db_path)
+            self.assertEqual(1612, connection.execute('SELECT COUNT(*) FROM "2016-stc-detailed"').fetchone()[0])
+            connection.close()
+
+    def testConnectNarrowTypes(self):
+        import os
+        dbf_path = os.path.join(os.path.dirname(__file__), "..", "examples")
+        connection = ex.connect(dbf_path, encoding="utf-8", narrow_types=True)
+        self.assertEqual(("integer",), connection.execute('SELECT DISTINCT typeof(amount) FROM "2016-stc-detailed"').fetchone())
+        executor = ex.SQLiteExecutor("$connect dbf '{}' utf-8 --narrow-types --sample-size 100 --strict; SELECT * FROM item".format(dbf_path))
+        executor.execute()
+
+    def testViewStreaming(self):
+        import io
+        import os
+        import sqlite3
+        import tempfile
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE t(n, s)")
+        connection.executemany("INSERT INTO t VALUES (?, ?)", [(i, "x" * i) for i in range(10)])
+        for limit, expected in ((0, ["n\ts", "..."]), (3, ["n\ts ", "0\t  ", "1\tx ", "2\txx", "..."]),
+                                (-1, ["n\ts ", "0\t  ", "1\tx ", "2\txx", "3\txxx"])):
+            output = io.StringIO()
+            ex.view(connection.execute("SELECT * FROM t WHERE n < 4"), limit, file=output, sample_size=3, batch_size=2)
+            self.assertEqual(expected, output.getvalue().splitlines())
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "page.txt")
+            ex.view(connection.execute("SELECT * FROM t"), -1, pager="head -n 2 > '{}'".format(path), batch_size=1)
+            with open(path) as f:
+                self.assertEqual(["n\ts        ", "0\t         "], f.read().splitlines())
+
+    def testViewPagerOption(self):
+        import os
+        import tempfile
+        from unittest import mock
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "page.txt")
+            script = "$connect sqlite ':memory:'; WITH RECURSIVE n(v) AS (SELECT 0 UNION ALL SELECT v+1 FROM n WHERE v < 29) SELECT v FROM n; {}"
+            with mock.patch.dict(os.environ, {"PAGER": "cat > '{}'".format(path)}):
+                ex.SQLiteExecutor(script.format("$view --pager 20")).execute()
+            with open(path) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(["v ", " 0", "19", "..."], [lines[0], lines[1], lines[20], lines[21]])
+
+            ex.SQLiteExecutor(script.format("$view 3 --pager=\"head -n 2 > '{}'\"".format(path))).execute()
+            with open(path) as f:
+                self.assertEqual(["v", "0"], [line.strip() for line in f.read().splitlines()])
+
+    def testCacheResults(self):
+        import csv
+        import os
+        import tempfile
+        import sqliteondbf.profiler as pr
+        with tempfile.TemporaryDirectory() as d:
+            csv_path = os.path.join(d, "t.csv")
+            script = """$connect sqlite ':memory:';
+                CREATE TABLE t(v); INSERT INTO t VALUES (1), (2), (3), (4);
+                $def counted(v):
+                    return v;
+                SELECT counted(v) AS v, 'a' AS v FROM t; $view 1; $export '{}'; $view""".format(csv_path)
+            for cache_results, calls in ((False, 11), (True, 4)):
+                profiler = pr.ScriptProfiler(profile_udfs=True)
+                ex.SQLiteExecutor(script, profiler=profiler, cache_results=cache_results).execute()
+                self.assertEqual(calls, profiler.udf_stats()[0]["calls"])
+                with open(csv_path, newline='', encoding='utf-8') as f:
+                    self.assertEqual([["v", "v"], ["1", "a"], ["4", "a"]], [row for i, row in enumerate(csv.reader(f)) if i in (0, 1, 4)])
+
+    def testCacheResultsDef(self):
+        import csv
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as d:
+            csv_path = os.path.join(d, "t.csv")
+            ex.SQLiteExecutor("""$connect sqlite ':memory:'; SELECT 1 AS v UNION ALL SELECT 2;
+                $def f(x):
+                    return x;
+                $export '{}'""".format(csv_path), cache_results=True).execute()
+            with open(csv_path, newline='', encoding='utf-8') as f:
+                self.assertEqual([["v"], ["1"], ["2"]], list(csv.reader(f)))
+
 if __name__ == '__main__':
     unittest.main()
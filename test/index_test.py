@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.index as ix
+import unittest
+import os
+import struct
+import tempfile
+
+def put(data, offset, value):
+    data[offset:offset+len(value)] = value
+
+class IndexTest(unittest.TestCase):
+    def test_expression_columns(self):
+        fields = ["item_code", "state_code", "amount"]
+        self.assertEqual(["item_code"], ix.expression_columns("ITEM_CODE", fields))
+        self.assertEqual(["state_code", "item_code"], ix.expression_columns("STATE_CODE+UPPER(ITEM_CODE)", fields))
+        self.assertEqual(["amount"], ix.expression_columns("STR(AMOUNT, 10, 2)", fields))
+        self.assertEqual(["item_code"], ix.expression_columns("D->ITEM_CODE", fields))
+        self.assertIsNone(ix.expression_columns("SUBSTR(ITEM_CODE, 1, 2)", fields))
+        self.assertIsNone(ix.expression_columns("OTHER", fields))
+
+    def test_files(self):
+        ndx = bytearray(512)
+        put(ndx, 24, b"ITEM_CODE\0")
+
+        mdx = bytearray(6 * 512)
+        put(mdx, 28, struct.pack("<H", 2))
+        put(mdx, 544, struct.pack("<L", 4))
+        put(mdx, 576, struct.pack("<L", 5))
+        put(mdx, 4 * 512 + 24, b"STATE_CODE\0")
+        put(mdx, 5 * 512 + 24, b"STATE_CODE+ITEM_CODE\0")
+
+        cdx = bytearray(3072)
+        put(cdx, 0, struct.pack("<L", 1024))
+        put(cdx, 1024, struct.pack("<HH", 3, 1))
+        put(cdx, 1024 + 14, struct.pack("<L", 0xFFFF))
+        cdx[1024 + 23] = 3
+        put(cdx, 1024 + 24, (2048).to_bytes(3, "little"))
+        put(cdx, 2048 + 510, struct.pack("<H", 10))
+        put(cdx, 2048 + 512, b"UPPER(ABC)\0")
+
+        with tempfile.TemporaryDirectory() as d:
+            for name, data in (("t.dbf", b""), ("t_code.ndx", ndx), ("t.mdx", mdx), ("t.cdx", cdx), ("u.mdx", mdx)):
+                with open(os.path.join(d, name), "wb") as f:
+                    f.write(data)
+
+            paths = ix.companion_index_files(os.path.join(d, "t.dbf"))
+            self.assertEqual(["t.cdx", "t.mdx", "t_code.ndx"], [os.path.basename(p) for p in paths])
+            self.assertEqual([["UPPER(ABC)"], ["STATE_CODE", "STATE_CODE+ITEM_CODE"], ["ITEM_CODE"]],
+                             [ix.read_key_expressions(p) for p in paths])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.executor as ex
+import unittest
+import os
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+class LazyTest(unittest.TestCase):
+    def test_lazy(self):
+        connection = ex.connect(EXAMPLES, encoding="utf-8", lazy=True)
+        self.assertEqual(["2016-stc-detailed", "item", "state"], connection.pending_tables())
+
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM item WHERE item_code = ?", ("T00",))
+        self.assertEqual((1,), cursor.fetchone())
+        self.assertEqual(["2016-stc-detailed", "state"], connection.pending_tables())
+
+        connection.execute('CREATE VIEW v AS SELECT * FROM "2016-stc-detailed" d JOIN state s ON d.state_code = s.state_code')
+        self.assertEqual(["2016-stc-detailed", "state"], connection.pending_tables())
+        expected = ex.connect(EXAMPLES, encoding="utf-8").execute(
+            'SELECT COUNT(*) FROM "2016-stc-detailed" d JOIN state s ON d.state_code = s.state_code').fetchone()
+        self.assertEqual(expected, connection.execute("SELECT COUNT(*) FROM v").fetchone())
+        self.assertEqual([], connection.pending_tables())
+
+    def test_lazy_script(self):
+        executor = ex.SQLiteExecutor('$connect dbf "{}" utf-8 --lazy; SELECT * FROM state; $view 1'.format(EXAMPLES))
+        executor.execute()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.executor as ex
+import sqliteondbf.profiler as pr
+import unittest
+import json
+import os
+import sqlite3
+import tempfile
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+class ProfilerTest(unittest.TestCase):
+    def test_query_plan(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE a(x, y)")
+        connection.execute("CREATE TABLE b(x, z)")
+        connection.execute("CREATE INDEX a_x ON a(x)")
+        self.assertEqual({"full_scans": 1, "sorts": 1, "autoindexes": 1},
+                         pr.query_plan(connection, "SELECT * FROM b JOIN a ON a.y = b.z ORDER BY b.z"))
+        self.assertEqual({"full_scans": 0, "sorts": 0, "autoindexes": 0}, pr.query_plan(connection, "SELECT * FROM a WHERE x = 1"))
+        self.assertIsNone(pr.query_plan(connection, "SELECT * FROM nothing"))
+
+    def test_executor(self):
+        profiler = pr.ScriptProfiler(profile_udfs=True)
+        executor = ex.SQLiteExecutor("""$connect dbf '{}' utf-8;
+            $def twice(v):
+                return 2*v;
+            SELECT twice(amount) FROM "2016-stc-detailed" ORDER BY state_code; $view 5; SELECT nothing""".format(EXAMPLES), profiler=profiler)
+        self.assertRaises(Exception, executor.execute)
+
+        self.assertEqual(5, len(profiler.entries))
+        select = profiler.entries[2]
+        self.assertEqual({"full_scans": 1, "sorts": 1, "autoindexes": 0}, select["plan"])
+        self.assertTrue(profiler.entries[4]["error"].startswith("OperationalError"))
+        self.assertEqual([("twice", 1612)], [(stat["name"], stat["calls"]) for stat in profiler.udf_stats()])
+        self.assertEqual(sorted(entry["seconds"] for entry in profiler.entries)[::-1],
+                         [entry["seconds"] for entry in profiler.summary()["instructions"]])
+        self.assertIn("twice (line 1)", profiler.format_summary())
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "profile.json")
+            profiler.write_json(path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(5, len(json.load(f)["instructions"]))
+
+if __name__ == '__main__':
+    unittest.main()
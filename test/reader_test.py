@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.reader as rd
+import unittest
+import os
+import struct
+import tempfile
+import dbfread
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+def write_dbf(path, fields, records):
+    """write a minimal dbf file. fields: (name, type, length, decimal_count),
+    records: (deleted flag, list of raw values)"""
+    recordlen = 1 + sum(f[2] for f in fields)
+    headerlen = 32 + 32 * len(fields) + 1
+    with open(path, "wb") as f:
+        f.write(struct.pack("<BBBBLHH20x", 3, 118, 10, 18, len(records), headerlen, recordlen))
+        for name, t, length, decimal_count in fields:
+            f.write(struct.pack("<11scLBB14x", name.encode("ascii"), t.encode("ascii"), 0, length, decimal_count))
+        f.write(b"\r")
+        for deleted, values in records:
+            f.write(b"*" if deleted else b" ")
+            for (_, _, length, _), value in zip(fields, values):
+                f.write(value.ljust(length))
+        f.write(b"\x1a")
+
+class ReaderTest(unittest.TestCase):
+    def test_examples(self):
+        for name in ("item.dbf", "state.dbf", "2016-stc-detailed.dbf"):
+            table = dbfread.DBF(os.path.join(EXAMPLES, name), lowernames=True, encoding="utf-8")
+            self.assertTrue(rd.DBFReader.supports(table))
+            expected = [tuple(rec.values()) for rec in table]
+            self.assertEqual(expected, list(rd.DBFReader(table)))
+            self.assertEqual(expected, list(rd.DBFReader(table, block_size=100)))
+
+    def test_types_and_deleted(self):
+        fields = [("c", "C", 5, 0), ("n", "N", 6, 2), ("i", "N", 4, 0), ("l", "L", 1, 0), ("d", "D", 8, 0)]
+        records = [
+            (False, [b"ab", b"  1.50", b"  12", b"T", b"20180102"]),
+            (True, [b"del", b"", b"", b"F", b""]),
+            (False, [b"", b"", b"  ", b"?", b"        "]),
+        ]
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "t.dbf")
+            write_dbf(path, fields, records)
+            table = dbfread.DBF(path)
+            expected = [tuple(rec.values()) for rec in table]
+            self.assertEqual(expected, list(rd.DBFReader(table, block_size=1)))
+            self.assertEqual(2, len(expected))
+
+    def test_mmap(self):
+        table = dbfread.DBF(os.path.join(EXAMPLES, "2016-stc-detailed.dbf"), lowernames=True, encoding="utf-8")
+        expected = [tuple(rec.values()) for rec in table]
+        self.assertEqual(expected, list(rd.DBFReader(table, use_mmap=True)))
+        self.assertEqual(expected, list(rd.DBFReader(table, block_size=1000, use_mmap=True)))
+
+        reader = rd.DBFReader(table, block_size=1000, use_mmap=True)
+        it = iter(reader)
+        self.assertEqual(expected[0], next(it))
+        it.close()
+        self.assertEqual(expected[10], reader.record(10))
+        self.assertRaises(IndexError, reader.record, len(expected))
+
+    def test_memo_not_supported(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "t.dbf")
+            write_dbf(path, [("m", "M", 10, 0)], [])
+            table = dbfread.DBF(path, ignore_missing_memofile=True)
+            self.assertFalse(rd.DBFReader.supports(table))
+
+if __name__ == '__main__':
+    unittest.main()
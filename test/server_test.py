@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.server as se
+import unittest
+import json
+import os
+import socket
+import tempfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from reader_test import write_dbf
+
+FIELDS = [("code", "C", 5, 0), ("amount", "N", 6, 0)]
+
+class QueryServerTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dbf_path = self.temp_dir.name
+        write_dbf(os.path.join(self.dbf_path, "t.dbf"), FIELDS, [(False, [b"a", b"1"]), (False, [b"b", b"2"])])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def serve(self, **kwargs):
+        server = se.QueryServer(self.dbf_path, address=("127.0.0.1", 0), pool_size=2, encoding="ascii", **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def get(self, server, path, data=None):
+        url = "http://{}:{}{}".format(*server.server_address, path)
+        with urllib.request.urlopen(url, data) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def test_query(self):
+        server = self.serve()
+        self.assertEqual({"t": [["code", "TEXT"], ["amount", "REAL"]]}, self.get(server, "/tables"))
+        self.assertEqual({"columns": ["code", "amount"], "rows": [["a", 1], ["b", 2]]},
+                         self.get(server, "/query?" + urllib.parse.urlencode({"sql": "SELECT * FROM t ORDER BY code"})))
+        self.assertEqual({"columns": ["n"], "rows": []},
+                         self.get(server, "/query?" + urllib.parse.urlencode({"sql": "SELECT amount AS n FROM t WHERE 0"})))
+        body = json.dumps({"sql": "SELECT code FROM t WHERE amount > ?", "params": [1]}).encode("utf-8")
+        self.assertEqual([["b"]], self.get(server, "/query", body)["rows"])
+
+        for path in ("/query?sql=DELETE+FROM+t", "/query?sql=SELECT+nothing", "/nothing"):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.get(server, path)
+            self.assertIn(context.exception.code, (400, 404))
+            self.assertIn("error", json.loads(context.exception.read().decode("utf-8")))
+
+    @unittest.skipIf(se._pyarrow is None, "needs pyarrow")
+    def test_arrow(self):
+        server = self.serve()
+        url = "http://{}:{}/query?{}".format(*server.server_address, urllib.parse.urlencode({"sql": "SELECT * FROM t", "format": "arrow"}))
+        with urllib.request.urlopen(url) as response:
+            table = se._pyarrow.ipc.open_stream(response.read()).read_all()
+        self.assertEqual({"code": ["a", "b"], "amount": [1, 2]}, table.to_pydict())
+
+    def test_refresh(self):
+        server = self.serve()
+        write_dbf(os.path.join(self.dbf_path, "t.dbf"), FIELDS, [(False, [b"a", b"1"]), (False, [b"b", b"2"]), (False, [b"c", b"3"])])
+        os.utime(os.path.join(self.dbf_path, "t.dbf"), (0, 1))
+        server.refresh()
+        self.assertEqual([[3]], self.get(server, "/query?sql=SELECT+COUNT(*)+FROM+t")["rows"])
+
+    def test_refresh_without_dbf_file(self):
+        os.remove(os.path.join(self.dbf_path, "t.dbf"))
+        server = self.serve()
+        server.refresh()
+        self.assertEqual({}, self.get(server, "/tables"))
+
+    def test_unix_socket(self):
+        path = os.path.join(self.dbf_path, "server.sock")
+        server = self.serve(unix_socket=path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(b"GET /query?sql=SELECT+COUNT(*)+FROM+t HTTP/1.0\r\n\r\n")
+            response = b""
+            data = client.recv(4096)
+            while data:
+                response += data
+                data = client.recv(4096)
+        self.assertTrue(response.startswith(b"HTTP/1.0 200"))
+        self.assertEqual([[2]], json.loads(response.split(b"\r\n\r\n", 1)[1].decode("utf-8"))["rows"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,5 +37,33 @@ class SplitterTest(unittest.TestCase):
             'this is one',
             'this is one'], l)
 
+    def test_instruction_options(self):
+        text="""
+        -- a comment;
+        $connect dbf path --jobs 2;
+        SELECT 1
+        """
+
+        l = list(sp.Splitter().split(text))
+        self.assertEqual(['$connect dbf path --jobs 2', 'SELECT 1'], l)
+
+    def test_comment_in_statement(self):
+        text="""SELECT a, -- the a; column
+        b /* ; */ FROM t; SELECT 'a-''b;c'"""
+
+        l = list(sp.Splitter().split(text))
+        self.assertEqual(['SELECT a,  \n        b   FROM t', "SELECT 'a-''b;c'"], l)
+
+    def test_unterminated(self):
+        self.assertEqual(["SELECT 1", "/* a; b"], list(sp.Splitter().split("SELECT 1; /* a; b")))
+        self.assertEqual(["SELECT 'a; b"], list(sp.Splitter().split("SELECT 'a; b")))
+
+    def test_blocks(self):
+        import io
+        text = "$def f(x):\n    return 'a;b\\';' + x; /* c; */ SELECT f('x') -- c;\n FROM t; -- end"
+        expected = list(sp.Splitter().split(text))
+        for block_size in range(1, 8):
+            self.assertEqual(expected, list(sp.Splitter(block_size=block_size).split(io.StringIO(text))))
+
 if __name__ == '__main__':
     unittest.main()
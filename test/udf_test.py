@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.executor as ex
+import sqliteondbf.udf as udf
+import unittest
+import os
+import sqlite3
+import tempfile
+
+class UDFTest(unittest.TestCase):
+    def test_parse_definition(self):
+        self.assertEqual(("f", "def f(v):return v", {}), udf.parse_definition("def f(v):return v"))
+        self.assertEqual(("f", "def f(v):return v", {"memoize": "10", "deterministic": True}),
+                         udf.parse_definition("def --memoize 10 --deterministic f(v):return v"))
+        self.assertEqual(("Sum", "class Sum():\n\tpass", {}), udf.parse_definition("aggregate Sum():\n\tpass"))
+        self.assertRaises(Exception, udf.parse_definition, "def (v):return v")
+
+    def test_compile_source(self):
+        source = "def f():\n    return 'compile_source'"
+        code = udf.compile_source(source)
+        self.assertIs(code, udf.compile_source(source))
+        with tempfile.TemporaryDirectory() as d:
+            source = "def f():\n    return 'compile_source 2'"
+            code = udf.compile_source(source, d)
+            self.assertEqual(1, len(os.listdir(d)))
+            udf._CODE_BY_KEY.clear()
+            self.assertEqual(code, udf.compile_source(source, d))
+
+    def test_memoize(self):
+        connection = sqlite3.connect(":memory:")
+        namespace = {}
+        udf.define_function(connection, "def calls():\n    return len(CALLS)", namespace)
+        namespace["CALLS"] = []
+        udf.define_function(connection, "def --memoize 2 double(v):\n    CALLS.append(v)\n    return 2*v", namespace)
+        rows = connection.execute("SELECT double(v) FROM (SELECT 1 AS v UNION ALL SELECT 2 UNION ALL SELECT 1)").fetchall()
+        self.assertEqual([(2,), (2,), (4,)], sorted(rows))
+        self.assertEqual([(2,)], connection.execute("SELECT calls()").fetchall())
+
+    def test_varargs(self):
+        connection = sqlite3.connect(":memory:")
+        udf.define_function(connection, "def joined(*args):\n    return ','.join(str(a) for a in args)")
+        udf.define_aggregate(connection, """aggregate Count():
+    def __init__(self):
+        self.n = 0
+
+    def step(self, *values):
+        self.n += len(values)
+
+    def finalize(self):
+        return self.n""")
+        self.assertEqual(("", "1", "1,2,3", 3), connection.execute(
+            "SELECT joined(), joined(1), joined(1, 2, 3), count(1, 2, 3)").fetchone())
+
+    @unittest.skipIf(udf.numpy is None, "needs numpy")
+    def test_batch_aggregate_varargs(self):
+        connection = sqlite3.connect(":memory:")
+        udf.define_aggregate(connection, """aggregate Arrays():
+    def __init__(self):
+        self.count = 0
+
+    def step_batch(self, *arrays):
+        self.count = len(arrays)
+
+    def finalize(self):
+        return self.count""")
+        self.assertEqual((1, 3), connection.execute("SELECT arrays(1), arrays(1, 2, 3)").fetchone())
+
+    def test_executor(self):
+        executor = ex.SQLiteExecutor("""$connect sqlite ':memory:';
+            $def --deterministic twice(v):
+                return 2*v;
+            $aggregate Product():
+                def __init__(self):
+                    self.p = 1
+
+                def step(self, v):
+                    self.p *= twice(v)
+
+                def finalize(self):
+                    return self.p;
+            CREATE TABLE t(v INTEGER); INSERT INTO t VALUES (1), (2), (3);
+            SELECT product(v) FROM t; $view""")
+        executor.execute()
+
+    @unittest.skipIf(udf.numpy is None, "needs numpy")
+    def test_batch_aggregate(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE t(g, v)")
+        connection.executemany("INSERT INTO t VALUES (?, ?)", [(i % 2, None if i == 5 else i) for i in range(10)])
+        udf.define_aggregate(connection, """aggregate --batch-size 2 Batches():
+    def __init__(self):
+        self.sizes = []
+
+    def step_batch(self, values, coefs):
+        self.sizes.append(str(len(values)))
+
+    def finalize(self):
+        return ",".join(self.sizes)""")
+        self.assertEqual([(0, "2,2,1"), (1, "2,2")], connection.execute("SELECT g, batches(v, 1) FROM t GROUP BY g").fetchall())
+
+        udf.register_batch_aggregates(connection, batch_size=3)
+        row = connection.execute("SELECT median(v), percentile(v, 25), variance(v), stddev(v) FROM t").fetchone()
+        values = [0, 1, 2, 3, 4, 6, 7, 8, 9]
+        mean = sum(values) / len(values)
+        variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+        self.assertEqual((4.0, 2.0), row[:2])
+        self.assertAlmostEqual(variance, row[2])
+        self.assertAlmostEqual(variance ** 0.5, row[3])
+        self.assertEqual((None, None), connection.execute("SELECT median(v), variance(v) FROM t WHERE v > 100").fetchone())
+
+    def test_redefine_pending(self):
+        executor = ex.SQLiteExecutor("""$connect sqlite ':memory:';
+            $def f(v):
+                return v;
+            SELECT 1 UNION ALL SELECT 2; $view 1;
+            $def f(v):
+                return 2*v;
+            $aggregate Median():
+                def step(self, v):
+                    pass
+
+                def finalize(self):
+                    return 0;
+            $view""")
+        executor.execute()
+
+if __name__ == '__main__':
+    unittest.main()
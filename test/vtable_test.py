@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""sqliteondbf - SQLite on DBF
+      Copyright (C) 2018 J. Férard <https://github.com/jferard>
+   This file is part of sqliteondbf.
+   sqliteondbf is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+   sqliteondbf is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+   """
+import sqliteondbf.executor as ex
+import sqliteondbf.vtable as vt
+import unittest
+import os
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "examples")
+QUERY = """SELECT s.state_name, SUM(d.amount) FROM "2016-stc-detailed" d JOIN state s ON d.state_code = s.state_code
+WHERE d.item_code = 'T00' GROUP BY s.state_name ORDER BY s.state_name"""
+
+@unittest.skipIf(vt.apsw is None, "apsw is not installed")
+class VirtualTableTest(unittest.TestCase):
+    def test_query(self):
+        expected = ex.connect(EXAMPLES, encoding="utf-8").execute(QUERY).fetchall()
+        connection = vt.connect(EXAMPLES, encoding="utf-8")
+        self.assertEqual(expected, [tuple(r) for r in connection.execute(QUERY)])
+
+    def test_create(self):
+        connection = vt.apsw.Connection(":memory:")
+        vt.register(connection)
+        connection.execute("CREATE VIRTUAL TABLE i USING dbf('{}', 'utf-8')".format(os.path.join(EXAMPLES, "item.dbf")))
+        self.assertEqual([("T00", "Total Taxes")],
+                         list(connection.execute("SELECT item_code, item_name FROM i WHERE rowid = 0")))
+
+    def test_memo(self):
+        import shutil
+        import tempfile
+        from unittest.mock import Mock
+        from reader_test import write_dbf
+        fields = [("c", "C", 5, 0), ("m", "M", 10, 0)]
+        with tempfile.TemporaryDirectory() as d:
+            shutil.copy(os.path.join(EXAMPLES, "item.dbf"), d)
+            for name in ("memo", "nomemo"):
+                path = os.path.join(d, "{}.dbf".format(name))
+                write_dbf(path, fields, [(False, [b"a", b"1".rjust(10)]), (True, [b"b", b"2".rjust(10)]),
+                                         (False, [b"c", b"".rjust(10)])])
+                with open(path, "r+b") as f:
+                    f.write(b"\x83")  # dBase III with a memo file
+            with open(os.path.join(d, "memo.dbt"), "wb") as f:
+                f.write(b"\x03".ljust(512, b"\x00") + b"first memo\x1a\x1a".ljust(512, b"\x00") +
+                        b"second memo\x1a\x1a".ljust(512, b"\x00"))
+
+            logger = Mock()
+            connection = vt.connect(d, logger, encoding="utf-8")
+            self.assertEqual([(0, "a", "first memo"), (2, "c", None)],
+                             [tuple(r) for r in connection.execute("SELECT rowid, c, m FROM memo")])
+            self.assertEqual(len(vt.dbfread.DBF(os.path.join(d, "item.dbf"))),
+                             len(list(connection.execute("SELECT * FROM item"))))
+            self.assertEqual(["item", "memo"], [r[0] for r in connection.execute(
+                "SELECT name FROM sqlite_master ORDER BY name")])
+            self.assertEqual(1, len(logger.warning.mock_calls))
+
+if __name__ == '__main__':
+    unittest.main()